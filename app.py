@@ -1,17 +1,38 @@
 import os
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify
+import click
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, make_response
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
-from flask_socketio import SocketIO, emit, join_room, leave_room
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 from flask_migrate import Migrate
-from flask_mail import Mail, Message as EmailMessage
+from flask_mail import Mail
 from werkzeug.utils import secure_filename
 from datetime import datetime, timedelta
-from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
 import os
+import queue
+import threading
+import time
 from dotenv import load_dotenv
 
-from models import db, User, Profile, Like, Message, Report, Block, Notification, Interest
+from models import db, User, Profile, Like, Match, Message, Report, Block, Notification, Interest
+from scoring import rank_candidates, compatibility_clause
+from cache import all_stats as cache_stats
+import chat_rooms
+import deck
+import exclusions
+import fulltext
+import geocoding
+import http_cache
+import images
+import outbox
+import pagination
+import recommendation_cache
+import user_cache
+from presence import LastSeenBuffer
+from stats import StatsCounters
+from querystats import QueryProfiler
+from passwords import PasswordHasher, PasswordHashBusy
+from socket_broker import LocalPubSubManager
 from forms import (RegistrationForm, LoginForm, ProfileForm, SearchForm, 
                       MessageForm, ReportForm, ResetPasswordRequestForm, ResetPasswordForm)
 
@@ -24,17 +45,22 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_pre_ping': True,
-    'pool_recycle': 300,
-    'connect_args': {
-        'sslmode': 'require',
+    'pool_recycle': 300
+}
+# Options propres à psycopg2 : SQLite (benchmarks, développement) les refuse.
+if (app.config['SQLALCHEMY_DATABASE_URI'] or '').startswith('postgres'):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {
+        'sslmode': os.getenv('DATABASE_SSLMODE', 'require'),
         'keepalives': 1,
         'keepalives_idle': 30,
         'keepalives_interval': 10,
         'keepalives_count': 5
     }
-}
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 app.config['UPLOAD_FOLDER'] = 'app/static/uploads/profiles'
+# Fichiers reçus en attente de traitement, hors du dossier servi publiquement.
+app.config['IMAGE_INBOX_FOLDER'] = os.getenv('IMAGE_INBOX_FOLDER', 'instance/uploads')
+app.config['IMAGE_WORKERS'] = int(os.getenv('IMAGE_WORKERS', 2))
 
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
 app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
@@ -42,11 +68,92 @@ app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True') == 'True'
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@onlyz.com')
+app.config['MAIL_ENABLED'] = os.getenv('MAIL_ENABLED', str(bool(app.config['MAIL_USERNAME']))) == 'True'
+app.config['MAIL_DIGEST_WINDOW'] = int(os.getenv('MAIL_DIGEST_WINDOW', 120))
+app.config['MAIL_MAX_ATTEMPTS'] = int(os.getenv('MAIL_MAX_ATTEMPTS', 5))
+app.config['MAIL_RETRY_BACKOFF'] = int(os.getenv('MAIL_RETRY_BACKOFF', 60))
+app.config['MAIL_OUTBOX_BATCH'] = int(os.getenv('MAIL_OUTBOX_BATCH', 50))
+app.config['MAIL_OUTBOX_INTERVAL'] = int(os.getenv('MAIL_OUTBOX_INTERVAL', 5))
+app.config['MAIL_OUTBOX_WORKERS'] = int(os.getenv('MAIL_OUTBOX_WORKERS', 1))
+# Durée de réservation d'un lot en cours d'envoi ; au-delà, il est repris par un autre worker.
+app.config['MAIL_SEND_LEASE'] = int(os.getenv('MAIL_SEND_LEASE', 300))
+
+app.config['RECOMMENDATION_CACHE_DEPTH'] = int(os.getenv('RECOMMENDATION_CACHE_DEPTH', 60))
+app.config['RECOMMENDATION_CACHE_TTL'] = int(os.getenv('RECOMMENDATION_CACHE_TTL', 6 * 3600))
+app.config['RECOMMENDATION_CACHE_EVICT_DAYS'] = int(os.getenv('RECOMMENDATION_CACHE_EVICT_DAYS', 30))
+app.config['RECOMMENDATION_ACTIVE_DAYS'] = int(os.getenv('RECOMMENDATION_ACTIVE_DAYS', 7))
+app.config['RECOMMENDATION_PRECOMPUTE_BATCH'] = int(os.getenv('RECOMMENDATION_PRECOMPUTE_BATCH', 200))
+app.config['RECOMMENDATION_PRECOMPUTE_INTERVAL'] = int(os.getenv('RECOMMENDATION_PRECOMPUTE_INTERVAL', 300))
+# Paquet de candidats de /deck/next : taille, seuil de recomplètement, durée de vie, construction par lots.
+app.config['DECK_SIZE'] = int(os.getenv('DECK_SIZE', 300))
+app.config['DECK_LOW_WATER'] = int(os.getenv('DECK_LOW_WATER', 50))
+app.config['DECK_TTL'] = int(os.getenv('DECK_TTL', 24 * 3600))
+app.config['DECK_BUILD_BATCH'] = int(os.getenv('DECK_BUILD_BATCH', 100))
+app.config['DECK_BUILD_INTERVAL'] = int(os.getenv('DECK_BUILD_INTERVAL', 600))
+
+# last_seen en base a au plus LAST_SEEN_MIN_INTERVAL + LAST_SEEN_FLUSH_INTERVAL de retard.
+app.config['LAST_SEEN_MIN_INTERVAL'] = int(os.getenv('LAST_SEEN_MIN_INTERVAL', 60))
+app.config['LAST_SEEN_FLUSH_INTERVAL'] = int(os.getenv('LAST_SEEN_FLUSH_INTERVAL', 30))
+app.config['LAST_SEEN_MAX_PENDING'] = int(os.getenv('LAST_SEEN_MAX_PENDING', 500))
+app.config['STATS_FLUSH_INTERVAL'] = int(os.getenv('STATS_FLUSH_INTERVAL', 60))
+app.config['STATS_RECONCILE_INTERVAL'] = int(os.getenv('STATS_RECONCILE_INTERVAL', 3600))
+# Nombre maximal de requêtes SQL par endpoint ou événement Socket.IO. Au-delà,
+# ou si une même requête se répète QUERY_REPEAT_THRESHOLD fois (N+1 probable) :
+# avertissement dans le log onlyz.sql, ou exception si QUERY_BUDGET_ACTION=raise.
+app.config['QUERY_BUDGETS'] = {
+    'browse': 5,
+    'search': 5,
+    'matches': 5,
+    'recommendations': 12,
+    'chat': 10,
+    'chat_history': 5,
+    # Like qui crée un match : 14 emails compris, 12 sans.
+    'like_user': 18,
+    'view_profile': 8,
+    'deck_next': 12,
+    'notifications': 6,
+    'send_message': 6,
+    'join': 3,
+    'load_history': 4,
+}
+app.config['QUERY_BUDGET_ACTION'] = os.getenv('QUERY_BUDGET_ACTION', 'warn')
+app.config['QUERY_REPEAT_THRESHOLD'] = int(os.getenv('QUERY_REPEAT_THRESHOLD', 5))
+app.config['QUERY_SLOWEST'] = int(os.getenv('QUERY_SLOWEST', 3))
+# Méthode et facteur de travail des nouveaux hashes ; les anciens sont refaits à la connexion.
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+# Processus de hachage (0 : sur place), calculs en cours au-delà desquels on refuse, attente maximale.
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 16))
+app.config['PASSWORD_HASH_TIMEOUT'] = int(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+# Ensembles bloqués/likés par utilisateur pour filtrer les listes (exclusions.py).
+app.config['EXCLUSION_CACHE_SIZE'] = int(os.getenv('EXCLUSION_CACHE_SIZE', 10000))
+app.config['EXCLUSION_CACHE_TTL'] = int(os.getenv('EXCLUSION_CACHE_TTL', 60))
+# Instantanés de l'utilisateur connecté (user_cache.py).
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 10000))
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 30))
+# File partagée entre workers Socket.IO : redis://... en production,
+# local://hôte:port pour le broker de socket_broker.py. Vide : un seul worker.
+app.config['SOCKETIO_MESSAGE_QUEUE'] = os.getenv('SOCKETIO_MESSAGE_QUEUE')
+# threading, eventlet ou gevent ; vide : détection automatique par Flask-SocketIO.
+app.config['SOCKETIO_ASYNC_MODE'] = os.getenv('SOCKETIO_ASYNC_MODE') or None
 
 db.init_app(app)
 migrate = Migrate(app, db)
 mail = Mail(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+if (app.config['SOCKETIO_MESSAGE_QUEUE'] or '').startswith('local://'):
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                        client_manager=LocalPubSubManager(app.config['SOCKETIO_MESSAGE_QUEUE']))
+else:
+    socketio = SocketIO(app, cors_allowed_origins="*", async_mode=app.config['SOCKETIO_ASYNC_MODE'],
+                        message_queue=app.config['SOCKETIO_MESSAGE_QUEUE'])
+last_seen_buffer = LastSeenBuffer(app)
+stats_counters = StatsCounters(app)
+query_profiler = QueryProfiler(app)
+password_hasher = PasswordHasher(app)
+exclusions.init_app(app)
+user_cache.init_app(app)
+# Cartes de profil des listes, rendues une fois par version du profil.
+app.jinja_env.globals['profile_card'] = http_cache.profile_card
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -54,6 +161,13 @@ login_manager.login_view = 'login'
 login_manager.login_message = 'Veuillez vous connecter pour accéder à cette page.'
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+HASH_BUSY_MESSAGE = 'Le serveur est très sollicité, veuillez réessayer dans quelques secondes.'
+RECOMMENDATIONS_PER_PAGE = 12
+app.config['BROWSE_PAGE_SIZE'] = int(os.getenv('BROWSE_PAGE_SIZE', 12))
+app.config['SEARCH_PAGE_SIZE'] = int(os.getenv('SEARCH_PAGE_SIZE', 24))
+# Lignes examinées au plus par page quand le filtre de distance écarte des candidats.
+app.config['SEARCH_SCAN_LIMIT'] = int(os.getenv('SEARCH_SCAN_LIMIT', 2000))
+CHAT_PAGE_SIZE = 50
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -61,7 +175,56 @@ def allowed_file(filename):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
+
+
+def save_profile_picture_upload(file):
+    if file and allowed_file(file.filename):
+        return images.save_upload(file, app.config['IMAGE_INBOX_FOLDER'], current_user.id)
+    return None
+
+
+def process_profile_picture(profile_id, upload_path):
+    # Les dérivés sont produits dans un pool de processus ; l'ancienne photo
+    # reste affichée jusqu'à ce qu'ils soient prêts.
+    stem = secure_filename(f"{profile_id}_{int(datetime.utcnow().timestamp())}")
+    future = images.submit(upload_path, app.config['UPLOAD_FOLDER'], stem, app.config['IMAGE_WORKERS'])
+    future.add_done_callback(lambda f: store_profile_picture(profile_id, upload_path, f))
+
+
+def store_profile_picture(profile_id, upload_path, future):
+    # Appelé par le pool quand les dérivés sont prêts : thread de gestion de
+    # concurrent.futures, ou greenthread sous eventlet (pools.ProcessPool).
+    with app.app_context():
+        try:
+            paths = future.result()
+            profile = db.session.get(Profile, profile_id)
+            if profile:
+                set_profile_pictures(profile, paths)
+                db.session.commit()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception('Traitement de la photo du profil %s échoué', profile_id)
+            # Fichier passé au contrôle de save_upload mais indécodable (JPEG tronqué...) :
+            # la requête est déjà terminée, l'utilisateur est prévenu par une notification.
+            profile = db.session.get(Profile, profile_id)
+            if profile:
+                db.session.add(Notification(
+                    user_id=profile.user_id,
+                    type='photo',
+                    content='Votre photo de profil n\'a pas pu être traitée. Essayez avec une autre image.'
+                ))
+                db.session.commit()
+        finally:
+            if os.path.exists(upload_path):
+                os.remove(upload_path)
+
+
+def set_profile_pictures(profile, paths):
+    profile.picture_avatar = f"uploads/profiles/{paths['avatar']}"
+    profile.picture_card = f"uploads/profiles/{paths['card']}"
+    profile.picture_full = f"uploads/profiles/{paths['full']}"
+    profile.profile_picture = profile.picture_full
 
 @app.route('/init-db')
 def init_db():
@@ -79,28 +242,214 @@ def init_db():
         return f"Erreur: {str(e)}"
 
 
+_background_started = False
+_background_lock = threading.Lock()
+
+
+def start_background_tasks():
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    socketio.start_background_task(flush_last_seen_loop)
+    socketio.start_background_task(stats_loop)
+    socketio.start_background_task(geocode_loop)
+    if app.config['MAIL_ENABLED']:
+        for _ in range(app.config['MAIL_OUTBOX_WORKERS']):
+            socketio.start_background_task(deliver_outbox_loop)
+    if app.config['RECOMMENDATION_PRECOMPUTE_INTERVAL'] > 0:
+        socketio.start_background_task(precompute_recommendations_loop)
+    socketio.start_background_task(deck_loop)
+
+
+def flush_last_seen_loop():
+    while True:
+        socketio.sleep(app.config['LAST_SEEN_FLUSH_INTERVAL'])
+        try:
+            last_seen_buffer.flush()
+        except Exception:
+            app.logger.exception('Écriture de last_seen échouée')
+
+
+def stats_loop():
+    # Écriture des incréments de ce worker ; recalage et instantané du jour
+    # par un seul worker toutes les STATS_RECONCILE_INTERVAL secondes.
+    while True:
+        try:
+            stats_counters.flush()
+            if stats_counters.reconcile(due_only=True) is not None:
+                stats_counters.snapshot()
+        except Exception:
+            app.logger.exception('Mise à jour des statistiques échouée')
+        socketio.sleep(app.config['STATS_FLUSH_INTERVAL'])
+
+
+def geocode_loop():
+    while True:
+        try:
+            profile_id = geocoding.jobs.get_nowait()
+        except queue.Empty:
+            socketio.sleep(1)
+            continue
+        with app.app_context():
+            try:
+                geocode_profile(profile_id)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Géocodage du profil %s échoué', profile_id)
+
+
+def geocode_profile(profile_id):
+    found = geocoding.resolve_profile(profile_id)
+    if found:
+        profile = db.session.get(Profile, profile_id)
+        recommendation_cache.invalidate(profile.user_id)
+        recommendation_cache.invalidate_nearby(profile.latitude, profile.longitude)
+    db.session.commit()
+    return found
+
+
+def deliver_outbox_loop():
+    while True:
+        socketio.sleep(app.config['MAIL_OUTBOX_INTERVAL'])
+        with app.app_context():
+            try:
+                while outbox.deliver_pending(mail) == app.config['MAIL_OUTBOX_BATCH']:
+                    pass
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Envoi des emails échoué')
+
+
+def precompute_recommendations_loop():
+    while True:
+        socketio.sleep(app.config['RECOMMENDATION_PRECOMPUTE_INTERVAL'])
+        with app.app_context():
+            try:
+                recommendation_cache.precompute(rank_recommendations)
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Précalcul des recommandations échoué')
+
+
+def deck_loop():
+    # Recomplètements demandés sous le seuil bas, et lots périodiques si activés.
+    next_batch = time.monotonic() + app.config['DECK_BUILD_INTERVAL']
+    while True:
+        socketio.sleep(1)
+        with app.app_context():
+            try:
+                deck.refill_pending(rank_candidates)
+                if app.config['DECK_BUILD_INTERVAL'] > 0 and time.monotonic() >= next_batch:
+                    deck.build_batch(rank_candidates)
+                    next_batch = time.monotonic() + app.config['DECK_BUILD_INTERVAL']
+            except Exception:
+                db.session.rollback()
+                app.logger.exception('Construction des paquets échouée')
+
+
+@app.cli.command('process-images')
+def process_images_command():
+    profiles = Profile.query.filter(Profile.profile_picture.isnot(None), Profile.picture_full.is_(None)).all()
+    jobs = []
+    for profile in profiles:
+        source = os.path.join(app.static_folder, profile.profile_picture)
+        if os.path.exists(source):
+            stem = secure_filename(f"{profile.id}_{int(datetime.utcnow().timestamp())}")
+            jobs.append((profile, images.submit(source, app.config['UPLOAD_FOLDER'], stem, app.config['IMAGE_WORKERS'])))
+    
+    done = 0
+    for profile, future in jobs:
+        try:
+            set_profile_pictures(profile, future.result())
+            done += 1
+        except Exception as e:
+            print(f'Profil {profile.id} : {e}')
+    db.session.commit()
+    print(f'{done} photos traitées')
+
+
+@app.cli.command('reindex-search')
+def reindex_search_command():
+    fulltext.refresh()
+    db.session.commit()
+    print(f'{Profile.query.count()} profils indexés')
+
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    counts = stats_counters.reconcile()
+    stats_counters.snapshot()
+    print(f'Compteurs : {counts}')
+    print(f'Écarts corrigés : {stats_counters.drift}')
+
+
+@app.cli.command('seed-geocache')
+@click.argument('path', default=geocoding.GAZETTEER_PATH)
+def seed_geocache_command(path):
+    count = geocoding.seed_from_gazetteer(path)
+    print(f'{count} lieux importés')
+
+
+@app.cli.command('geocode-pending')
+@click.option('--limit', default=500)
+def geocode_pending_command(limit):
+    found = sum(geocode_profile(profile_id) for profile_id in geocoding.pending_profile_ids(limit))
+    print(f'{found} profils localisés')
+
+
+@app.cli.command('send-outbox')
+def send_outbox_command():
+    total = 0
+    while True:
+        sent = outbox.deliver_pending(mail)
+        total += sent
+        if sent < app.config['MAIL_OUTBOX_BATCH']:
+            break
+    print(f'{total} emails envoyés')
+
+
+@app.cli.command('backfill-matches')
+def backfill_matches_command():
+    count = Match.backfill_from_likes()
+    print(f'{count} matchs créés')
+
+
+@app.cli.command('precompute-recommendations')
+def precompute_recommendations_command():
+    count = recommendation_cache.precompute(rank_recommendations)
+    print(f'{count} utilisateurs recalculés')
+
+
+@app.cli.command('build-decks')
+def build_decks_command():
+    count = deck.build_batch(rank_candidates)
+    print(f'{count} paquets construits')
+
+
 @app.before_request
 def before_request():
+    start_background_tasks()
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
+        last_seen_buffer.touch(current_user.id, current_user.last_seen)
 
 
 @app.route('/')
 def index():
     if current_user.is_authenticated:
         return redirect(url_for('browse'))
-    return render_template('index.html')
+    return http_cache.static_page('index.html')
 
 
 @app.route('/privacy')
 def privacy():
-    return render_template('privacy.html')
+    return http_cache.static_page('privacy.html')
 
 
 @app.route('/terms')
 def terms():
-    return render_template('terms.html')
+    return http_cache.static_page('terms.html')
 
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -110,15 +459,21 @@ def register():
     
     form = RegistrationForm()
     if form.validate_on_submit():
+        try:
+            password_hash = password_hasher.hash(form.password.data)
+        except PasswordHashBusy:
+            flash(HASH_BUSY_MESSAGE, 'warning')
+            return render_template('register.html', form=form), 503
         user = User(
             username=form.username.data,
             email=form.email.data,
+            password_hash=password_hash,
             accepted_terms=True
         )
-        user.set_password(form.password.data)
         
         db.session.add(user)
         db.session.commit()
+        stats_counters.incr('users')
         
         flash('Compte créé avec succès ! Vous pouvez maintenant vous connecter.', 'success')
         return redirect(url_for('login'))
@@ -134,7 +489,14 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            valid = user is not None and password_hasher.verify(user.password_hash, form.password.data)
+        except PasswordHashBusy:
+            flash(HASH_BUSY_MESSAGE, 'warning')
+            return render_template('login.html', form=form), 503
+        if valid:
+            if password_hasher.rehash(user, form.password.data):
+                db.session.commit()
             login_user(user, remember=form.remember_me.data)
             next_page = request.args.get('next')
             
@@ -171,6 +533,11 @@ def admin_login():
         
         if password and password == admin_password:
             admin_user = User.query.filter_by(username='admin').first()
+            try:
+                admin_hash = password_hasher.hash(admin_password)
+            except PasswordHashBusy:
+                flash(HASH_BUSY_MESSAGE, 'warning')
+                return render_template('admin_login.html'), 503
             
             if not admin_user:
                 admin_user = User(
@@ -179,15 +546,17 @@ def admin_login():
                     accepted_terms=True,
                     is_admin=True
                 )
-                admin_user.set_password(admin_password)
+                admin_user.password_hash = admin_hash
                 db.session.add(admin_user)
                 db.session.commit()
             else:
                 admin_user.is_admin = True
-                admin_user.set_password(admin_password)
+                admin_user.password_hash = admin_hash
                 db.session.commit()
             
             login_user(admin_user)
+            # Après login_user : la session est celle de l'admin, sa version change aussi.
+            user_cache.invalidate(admin_user.id)
             flash('Bienvenue dans l\'espace administrateur', 'success')
             return redirect(url_for('admin_dashboard'))
         else:
@@ -203,23 +572,51 @@ def admin_dashboard():
         flash('Accès refusé. Cette page est réservée aux administrateurs.', 'danger')
         return redirect(url_for('index'))
     
-    total_users = User.query.count()
-    total_profiles = Profile.query.count()
-    total_matches = Like.query.count()
-    total_messages = Message.query.count()
+    # Compteurs entretenus par les chemins d'écriture : aucun COUNT(*) ici.
+    totals = stats_counters.totals()
+    trends = stats_counters.trends(days=30)
+    days = sorted(trends)
+    
+    def growth(name, period):
+        past = [day for day in days if day <= days[-1] - timedelta(days=period)] if days else []
+        if not past or name not in trends[past[-1]]:
+            return None
+        return totals[name] - trends[past[-1]][name]
     
     recent_users = User.query.order_by(User.created_at.desc()).limit(10).all()
     recent_reports = Report.query.order_by(Report.created_at.desc()).limit(10).all()
     
     return render_template('admin.html', 
-                         total_users=total_users,
-                         total_profiles=total_profiles,
-                         total_matches=total_matches,
-                         total_messages=total_messages,
+                         total_users=totals['users'],
+                         total_profiles=totals['profiles'],
+                         total_likes=totals['likes'],
+                         total_matches=totals['matches'],
+                         total_messages=totals['messages'],
+                         growth={name: growth(name, 7) for name in totals},
+                         trend_days=[(day, trends[day]) for day in reversed(days[-14:])],
                          recent_users=recent_users,
                          recent_reports=recent_reports)
 
 
+@app.route('/admin/cache-stats')
+@login_required
+def admin_cache_stats():
+    if not current_user.is_admin:
+        return jsonify({'error': 'Accès refusé'}), 403
+    
+    return jsonify({
+        'recommendations': recommendation_cache.get_stats(),
+        'deck': deck.get_stats(),
+        'last_seen': last_seen_buffer.stats(),
+        'stats': stats_counters.stats(),
+        'queries': query_profiler.stats(),
+        'passwords': password_hasher.stats(),
+        'user_snapshots': user_cache.get_stats(),
+        'chat_rooms': chat_rooms.stats(),
+        **cache_stats()
+    })
+
+
 @app.route('/profile/create', methods=['GET', 'POST'])
 @login_required
 def create_profile():
@@ -228,6 +625,12 @@ def create_profile():
     
     form = ProfileForm()
     if form.validate_on_submit():
+        try:
+            upload_path = save_profile_picture_upload(form.profile_picture.data)
+        except images.InvalidImage as e:
+            flash(str(e), 'danger')
+            return render_template('profile_form.html', form=form, title='Créer mon profil')
+        
         profile = Profile(
             user_id=current_user.id,
             first_name=form.first_name.data,
@@ -240,26 +643,21 @@ def create_profile():
             country=form.country.data
         )
         
+        needs_geocoding = False
         if form.city.data and form.country.data:
-            try:
-                geolocator = Nominatim(user_agent="onlyz_app")
-                location = geolocator.geocode(f"{form.city.data}, {form.country.data}")
-                if location:
-                    profile.latitude = location.latitude
-                    profile.longitude = location.longitude
-            except:
-                pass
-        
-        if form.profile_picture.data:
-            file = form.profile_picture.data
-            if file and allowed_file(file.filename):
-                filename = secure_filename(f"{current_user.id}_{datetime.utcnow().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                profile.profile_picture = f"uploads/profiles/{filename}"
+            needs_geocoding = not geocoding.locate(profile)
         
         db.session.add(profile)
+        db.session.flush()
+        fulltext.refresh([profile.id])
+        recommendation_cache.invalidate(current_user.id)
+        recommendation_cache.invalidate_nearby(profile.latitude, profile.longitude)
         db.session.commit()
+        stats_counters.incr('profiles')
+        if needs_geocoding:
+            geocoding.enqueue(profile.id)
+        if upload_path:
+            process_profile_picture(profile.id, upload_path)
         
         flash('Profil créé avec succès !', 'success')
         return redirect(url_for('browse'))
@@ -275,6 +673,14 @@ def edit_profile():
     
     form = ProfileForm()
     if form.validate_on_submit():
+        try:
+            upload_path = save_profile_picture_upload(form.profile_picture.data)
+        except images.InvalidImage as e:
+            flash(str(e), 'danger')
+            return render_template('profile_form.html', form=form, title='Éditer mon profil')
+        
+        previous_location = (current_user.profile.latitude, current_user.profile.longitude)
+        previous_place = (current_user.profile.city, current_user.profile.country)
         current_user.profile.first_name = form.first_name.data
         current_user.profile.last_name = form.last_name.data
         current_user.profile.date_of_birth = form.date_of_birth.data
@@ -283,26 +689,28 @@ def edit_profile():
         current_user.profile.bio = form.bio.data
         current_user.profile.city = form.city.data
         current_user.profile.country = form.country.data
+        # Explicite : onupdate ne se déclenche pas si seuls les centres d'intérêt changent.
+        current_user.profile.updated_at = datetime.utcnow()
         
-        if form.city.data and form.country.data:
-            try:
-                geolocator = Nominatim(user_agent="onlyz_app")
-                location = geolocator.geocode(f"{form.city.data}, {form.country.data}")
-                if location:
-                    current_user.profile.latitude = location.latitude
-                    current_user.profile.longitude = location.longitude
-            except:
-                pass
-        
-        if form.profile_picture.data:
-            file = form.profile_picture.data
-            if file and allowed_file(file.filename):
-                filename = secure_filename(f"{current_user.id}_{datetime.utcnow().timestamp()}.{file.filename.rsplit('.', 1)[1].lower()}")
-                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(filepath)
-                current_user.profile.profile_picture = f"uploads/profiles/{filename}"
+        needs_geocoding = False
+        if form.city.data and form.country.data and (
+                current_user.profile.latitude is None
+                or not geocoding.same_place(form.city.data, form.country.data, *previous_place)):
+            current_user.profile.latitude = None
+            current_user.profile.longitude = None
+            needs_geocoding = not geocoding.locate(current_user.profile)
         
+        recommendation_cache.invalidate(current_user.id)
+        recommendation_cache.invalidate_nearby(*previous_location)
+        recommendation_cache.invalidate_nearby(current_user.profile.latitude, current_user.profile.longitude)
+        db.session.flush()
+        fulltext.refresh([current_user.profile.id])
         db.session.commit()
+        http_cache.invalidate_profile(current_user.profile.id)
+        if needs_geocoding:
+            geocoding.enqueue(current_user.profile.id)
+        if upload_path:
+            process_profile_picture(current_user.profile.id, upload_path)
         flash('Profil mis à jour !', 'success')
         return redirect(url_for('my_profile'))
     
@@ -322,24 +730,43 @@ def edit_profile():
 @app.route('/profile/<int:user_id>')
 @login_required
 def view_profile(user_id):
-    user = User.query.get_or_404(user_id)
+    user = User.query.options(db.joinedload(User.profile)).get_or_404(user_id)
     if not user.profile:
         flash('Ce profil n\'existe pas', 'danger')
         return redirect(url_for('browse'))
     
-    if current_user.has_blocked(user_id) or current_user.is_blocked_by(user_id):
+    if exclusions.is_blocked_between(current_user.id, user_id):
         flash('Vous ne pouvez pas voir ce profil', 'danger')
         return redirect(url_for('browse'))
     
-    has_liked = current_user.has_liked(user_id)
-    is_matched = current_user.is_matched(user_id)
-    distance = None
+    # Like et match en une seule requête : c'est tout ce qu'il faut pour l'ETag.
+    has_liked, is_matched = db.session.execute(db.select(
+        db.select(Like.id).filter_by(liker_id=current_user.id, liked_id=user_id).exists(),
+        Match.for_pair(current_user.id, user_id).exists()
+    )).one()
     
-    if current_user.profile and user.profile:
-        distance = current_user.profile.get_distance(user.profile)
+    viewer_profile = current_user.profile
+    viewer_updated_at = viewer_profile.updated_at if viewer_profile else None
+    # L'âge affiché change à l'anniversaire : la page vaut au plus pour la journée.
+    today = datetime.utcnow().date()
+    etag = http_cache.etag_for(
+        user_id, http_cache.profile_version(user.profile),
+        current_user.id, viewer_updated_at,
+        has_liked, is_matched, current_user.unread_notifications, today
+    )
+    last_modified = max(datetime.combine(today, datetime.min.time()),
+                        *filter(None, (user.profile.updated_at, viewer_updated_at)))
+    response = http_cache.not_modified(etag, last_modified)
+    if response is not None:
+        return response
     
-    return render_template('profile.html', user=user, has_liked=has_liked, 
-                         is_matched=is_matched, distance=distance)
+    distance = None
+    if viewer_profile and user.profile:
+        distance = viewer_profile.get_distance(user.profile)
+    
+    response = make_response(render_template('profile.html', user=user, has_liked=has_liked, 
+                                             is_matched=is_matched, distance=distance))
+    return http_cache.conditional(response, etag, last_modified)
 
 
 @app.route('/profile/me')
@@ -356,24 +783,26 @@ def browse():
     if not current_user.profile:
         return redirect(url_for('create_profile'))
     
-    page = request.args.get('page', 1, type=int)
-    per_page = 12
-    
-    blocked_users = [block.blocked_id for block in current_user.blocks_made.all()]
-    blocked_by = [block.blocker_id for block in current_user.blocks_received.all()]
-    all_blocked = list(set(blocked_users + blocked_by + [current_user.id]))
-    
-    query = User.query.join(Profile).filter(
-        User.id.notin_(all_blocked),
-        Profile.looking_for.in_([current_user.profile.gender, 'tous'])
+    # Le profil vient de la jointure déjà faite : pas de requête par carte.
+    query = User.query.join(Profile).options(db.contains_eager(User.profile)).filter(
+        exclusions.exclusion_clause(current_user.id),
+        compatibility_clause(current_user.profile)
     )
     
-    if current_user.profile.looking_for != 'tous':
-        query = query.filter(Profile.gender == current_user.profile.looking_for)
-    
-    users = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Membres les plus récents d'abord, paginés par curseur (created_at, id) :
+    # ni COUNT(*) ni OFFSET, une page profonde coûte autant que la première.
+    keyset = [(User.created_at, True), (User.id, True)]
+    before = request.args.get('before')
+    cursor = pagination.decode_cursor(before or request.args.get('after'), datetime, int)
+    users, prev_cursor, next_cursor = pagination.keyset_page(
+        query, keyset,
+        key=lambda user: pagination.encode_cursor(user.created_at, user.id),
+        page_size=app.config['BROWSE_PAGE_SIZE'],
+        cursor=cursor,
+        backwards=bool(before and cursor)
+    )
     
-    return render_template('browse.html', users=users)
+    return render_template('browse.html', users=users, prev_cursor=prev_cursor, next_cursor=next_cursor)
 
 
 @app.route('/recommendations')
@@ -386,21 +815,34 @@ def recommendations():
     return render_template('recommendations.html', users=recommended_users)
 
 
-@app.route('/search', methods=['GET', 'POST'])
+def within_distance(origin, max_distance):
+    """Filtre exact des lignes (utilisateur, ...) de la recherche, après le préfiltre within_radius."""
+    def accept(row):
+        profile = row[0].profile
+        if not (profile.latitude and profile.longitude):
+            return False
+        distance = origin.get_distance(profile)
+        return bool(distance) and distance <= max_distance
+    return accept
+
+
+@app.route('/search')
 @login_required
 def search():
     if not current_user.profile:
         return redirect(url_for('create_profile'))
     
-    form = SearchForm()
+    # Formulaire en GET : les filtres voyagent avec le curseur dans l'URL.
+    # Sans filtre, valeurs par défaut du formulaire (18-99 ans, 100 km).
+    filters = {k: v for k, v in request.args.items() if k != 'after'}
+    form = SearchForm(formdata=request.args if filters else None, meta={'csrf': False})
     results = []
+    next_cursor = None
     
-    if form.validate_on_submit() or request.method == 'GET':
-        blocked_users = [block.blocked_id for block in current_user.blocks_made.all()]
-        blocked_by = [block.blocker_id for block in current_user.blocks_received.all()]
-        all_blocked = list(set(blocked_users + blocked_by + [current_user.id]))
-        
-        query = User.query.join(Profile).filter(User.id.notin_(all_blocked))
+    if not filters or form.validate():
+        query = User.query.join(Profile).options(db.contains_eager(User.profile)).filter(
+            exclusions.exclusion_clause(current_user.id)
+        )
         
         if form.gender.data:
             query = query.filter(Profile.gender == form.gender.data)
@@ -414,20 +856,39 @@ def search():
             query = query.filter(Profile.date_of_birth >= min_birth_date)
         
         if form.keywords.data:
-            query = query.filter(Profile.bio.ilike(f"%{form.keywords.data}%"))
+            # Curseur (pertinence, id) : stable tant que la pertinence des profils ne
+            # change pas. Sous PostgreSQL, ts_rank_cd ne dépend que du profil et des
+            # mots-clés ; sous SQLite, bm25 dépend de tout l'index et une page peut
+            # sauter ou répéter des profils si l'index change entre deux pages.
+            query, relevance = fulltext.matching(query, form.keywords.data)
+            keyset = [(relevance, True), (User.id, False)]
+            cursor = pagination.decode_cursor(request.args.get('after'), float, int)
+        else:
+            keyset = [(User.id, False)]
+            cursor = pagination.decode_cursor(request.args.get('after'), int)
         
-        results = query.all()
+        if cursor:
+            query = query.filter(pagination.after(keyset, cursor))
+        query = query.add_columns(*[column for column, _ in keyset])
+        query = query.order_by(*pagination.order(keyset))
         
+        accept = None
         if form.max_distance.data and current_user.profile.latitude and current_user.profile.longitude:
-            filtered_results = []
-            for user in results:
-                if user.profile.latitude and user.profile.longitude:
-                    distance = current_user.profile.get_distance(user.profile)
-                    if distance and distance <= form.max_distance.data:
-                        filtered_results.append(user)
-            results = filtered_results
+            query = query.filter(Profile.within_radius(current_user.profile.latitude,
+                                                       current_user.profile.longitude,
+                                                       form.max_distance.data))
+            accept = within_distance(current_user.profile, form.max_distance.data)
+        
+        rows, next_cursor = pagination.stream_page(
+            query,
+            key=lambda row: pagination.encode_cursor(*row[1:]),
+            page_size=app.config['SEARCH_PAGE_SIZE'],
+            accept=accept,
+            scan_limit=app.config['SEARCH_SCAN_LIMIT']
+        )
+        results = [row[0] for row in rows]
     
-    return render_template('search.html', form=form, results=results)
+    return render_template('search.html', form=form, results=results, next_cursor=next_cursor, filters=filters)
 
 
 @app.route('/like/<int:user_id>', methods=['POST'])
@@ -438,25 +899,40 @@ def like_user(user_id):
     if user_id == current_user.id:
         return jsonify({'error': 'Vous ne pouvez pas vous liker vous-même'}), 400
     
-    if current_user.has_blocked(user_id) or current_user.is_blocked_by(user_id):
+    if exclusions.is_blocked_between(current_user.id, user_id):
         return jsonify({'error': 'Action impossible'}), 400
     
+    Match.lock_pair(current_user.id, user_id)
     existing_like = Like.query.filter_by(liker_id=current_user.id, liked_id=user_id).first()
     
     if existing_like:
         db.session.delete(existing_like)
+        unmatched = Match.for_pair(current_user.id, user_id).delete(synchronize_session=False)
+        recommendation_cache.invalidate(current_user.id)
         db.session.commit()
+        stats_counters.incr('likes', -1)
+        stats_counters.incr('matches', -unmatched)
+        exclusions.invalidate(current_user.id)
+        chat_rooms.revoke(current_user.id, user_id)
+        # Propagé à tous les workers par la file de messages.
+        socketio.close_room(chat_rooms.room_name(current_user.id, user_id))
         return jsonify({'status': 'unliked', 'is_match': False})
     
     like = Like(liker_id=current_user.id, liked_id=user_id)
     db.session.add(like)
-    db.session.commit()
-    
-    is_match = like.is_match()
+    recommendation_cache.remove_candidate(current_user.id, user_id, RECOMMENDATIONS_PER_PAGE)
+    deck.consume(current_user.id, user_id)
+    # Lu avant le commit, qui expirerait l'utilisateur (une requête de plus).
+    my_id = current_user.id
     
-    if is_match:
+    # Like, like réciproque et match dans la même transaction, sous le verrou
+    # de la paire pris plus haut.
+    is_match = db.session.query(Like.query.filter_by(liker_id=user_id, liked_id=my_id).exists()).scalar()
+    pushed = []
+    matched = is_match and Match.create(my_id, user_id)
+    if matched:
         notif1 = Notification(
-            user_id=current_user.id,
+            user_id=my_id,
             type='match',
             content=f'Vous avez un nouveau match avec {user.username} !',
             related_user_id=user_id
@@ -465,18 +941,59 @@ def like_user(user_id):
             user_id=user_id,
             type='match',
             content=f'Vous avez un nouveau match avec {current_user.username} !',
-            related_user_id=current_user.id
+            related_user_id=my_id
         )
         db.session.add(notif1)
         db.session.add(notif2)
-        db.session.commit()
-        
-        send_match_email(current_user, user)
-        send_match_email(user, current_user)
+        outbox.queue_match_email(current_user, user)
+        outbox.queue_match_email(user, current_user)
+        db.session.flush()
+        pushed = notification_events(notif1, notif2)
+    db.session.commit()
+    exclusions.invalidate(my_id)
+    stats_counters.incr('likes')
+    if matched:
+        stats_counters.incr('matches')
+        push_notifications(pushed)
     
     return jsonify({'status': 'liked', 'is_match': is_match})
 
 
+@app.route('/deck/next')
+@login_required
+def deck_next():
+    if not current_user.profile:
+        return jsonify({'error': 'Profil requis'}), 400
+    
+    user = None
+    while user is None:
+        candidate_id, remaining = deck.pop(current_user, rank_candidates)
+        if candidate_id is None:
+            db.session.commit()
+            return jsonify({'user': None, 'remaining': 0})
+        # Compte supprimé ou profil devenu incompatible depuis la construction du paquet : candidat suivant.
+        user = User.query.join(Profile).options(db.contains_eager(User.profile)).filter(
+            User.id == candidate_id,
+            compatibility_clause(current_user.profile)
+        ).first()
+    
+    # Lu avant le commit, qui expirerait le candidat et son profil.
+    picture = user.profile.picture_path('card')
+    payload = {
+        'user': {
+            'id': user.id,
+            'username': user.username,
+            'age': user.profile.get_age(),
+            'city': user.profile.city,
+            'picture': url_for('static', filename=picture) if picture else None,
+            'url': url_for('view_profile', user_id=user.id),
+        },
+        'remaining': remaining
+    }
+    db.session.commit()
+    return jsonify(payload)
+
+
 @app.route('/matches')
 @login_required
 def matches():
@@ -496,15 +1013,43 @@ def chat(user_id):
         flash('Vous devez d\'abord matcher avec cette personne', 'warning')
         return redirect(url_for('matches'))
     
-    messages = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
-        ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.created_at.asc()).all()
-    
+    # Marqués lus avant de charger l'historique : le commit expirerait sinon
+    # chaque message chargé, relu un par un au rendu.
     Message.query.filter_by(sender_id=user_id, receiver_id=current_user.id, is_read=False).update({'is_read': True})
     db.session.commit()
     
-    return render_template('chat.html', other_user=user, messages=messages)
+    messages, has_more = Message.history(current_user.id, user_id, limit=CHAT_PAGE_SIZE)
+    
+    return render_template('chat.html', other_user=user, messages=messages, has_more=has_more,
+                           cursor=messages[0].cursor if messages else None)
+
+
+def chat_history_page(user_id, before):
+    cursor = Message.parse_cursor(before)
+    if cursor is None or not current_user.is_matched(user_id):
+        return None
+    
+    messages, has_more = Message.history(current_user.id, user_id, before=cursor, limit=CHAT_PAGE_SIZE)
+    return {
+        'messages': [{
+            'id': message.id,
+            'sender_id': message.sender_id,
+            'content': message.content,
+            'created_at': message.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'time': message.created_at.strftime('%H:%M')
+        } for message in messages],
+        'has_more': has_more,
+        'cursor': messages[0].cursor if messages else None
+    }
+
+
+@app.route('/chat/<int:user_id>/messages')
+@login_required
+def chat_history(user_id):
+    page = chat_history_page(user_id, request.args.get('before'))
+    if page is None:
+        return jsonify({'error': 'Requête invalide'}), 400
+    return jsonify(page)
 
 
 @app.route('/report/<int:user_id>', methods=['POST'])
@@ -542,166 +1087,179 @@ def block_user(user_id):
     else:
         block = Block(blocker_id=current_user.id, blocked_id=user_id)
         db.session.add(block)
+        recommendation_cache.remove_candidate(current_user.id, user_id, RECOMMENDATIONS_PER_PAGE)
+        recommendation_cache.remove_candidate(user_id, current_user.id, RECOMMENDATIONS_PER_PAGE)
+        deck.consume(current_user.id, user_id)
+        deck.consume(user_id, current_user.id)
         db.session.commit()
+        exclusions.invalidate(current_user.id, user_id)
         flash('Utilisateur bloqué', 'success')
     
     return redirect(url_for('browse'))
 
 
+def notification_events(*notifications):
+    # Lu avant le commit, qui expire les objets et forcerait un rechargement.
+    return [(f'user_{n.user_id}', n.to_dict()) for n in notifications]
+
+
+def push_notifications(events):
+    for room, payload in events:
+        socketio.emit('notification', payload, to=room)
+
+
 @app.route('/notifications')
 @login_required
 def notifications():
-    notifs = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).limit(50).all()
-    
-    Notification.query.filter_by(user_id=current_user.id, is_read=False).update({'is_read': True})
+    # Comme pour le chat : lues d'abord, chargées ensuite, sinon le commit
+    # expire chaque notification et le rendu les relit une par une.
+    Notification.mark_all_read(user_cache.fresh(current_user))
     db.session.commit()
     
+    notifs = Notification.query.filter_by(user_id=current_user.id).order_by(Notification.created_at.desc()).limit(50).all()
+    
     return render_template('notifications.html', notifications=notifs)
 
 
+def authorize_chat(other_id):
+    # Une seule requête : le match et ce qu'il faut du destinataire pour les notifications.
+    row = db.session.query(User.id, User.username, User.email).filter(
+        User.id == other_id,
+        Match.for_pair(current_user.id, other_id).exists()
+    ).first()
+    if row is None:
+        return None
+    
+    peer = chat_rooms.ChatPeer(*row)
+    chat_rooms.authorize(request.sid, current_user.id, peer)
+    return peer
+
+
 @socketio.on('join')
+@query_profiler.track('join')
 def on_join(data):
     room = data['room']
+    other_id = chat_rooms.parse_room(room, current_user.id)
+    if other_id is None or authorize_chat(other_id) is None:
+        emit('error', {'msg': 'Vous n\'êtes pas matchés'})
+        return
+    
     join_room(room)
     emit('status', {'msg': f'{current_user.username} a rejoint la conversation'}, room=room)
 
 
 @socketio.on('leave')
+@query_profiler.track('leave')
 def on_leave(data):
     room = data['room']
+    other_id = chat_rooms.parse_room(room, current_user.id)
+    if other_id is not None:
+        chat_rooms.leave(request.sid, other_id)
     leave_room(room)
     emit('status', {'msg': f'{current_user.username} a quitté la conversation'}, room=room)
 
 
+@socketio.on('connect')
+@query_profiler.track('connect')
+def on_connect(*args):
+    if current_user.is_authenticated:
+        join_room(f'user_{current_user.id}')
+
+
+@socketio.on('disconnect')
+@query_profiler.track('disconnect')
+def on_disconnect(*args):
+    chat_rooms.forget(request.sid)
+
+
+@socketio.on('load_history')
+@query_profiler.track('load_history')
+def handle_load_history(data):
+    if not current_user.is_authenticated:
+        return {'error': 'Non connecté'}
+    page = chat_history_page(int(data['user_id']), data.get('before'))
+    if page is None:
+        return {'error': 'Requête invalide'}
+    return page
+
+
 @socketio.on('send_message')
+@query_profiler.track('send_message')
 def handle_message(data):
-    receiver_id = data['receiver_id']
+    receiver_id = int(data['receiver_id'])
     content = data['content']
     
-    if not current_user.is_matched(receiver_id):
+    # Autorisation vérifiée au join ; on ne retourne en base que si le
+    # client écrit sans être dans le salon (jamais rejoint, ou fermé par
+    # un unlike sur n'importe quel worker).
+    room = chat_rooms.room_name(current_user.id, receiver_id)
+    receiver = None
+    if room in rooms():
+        receiver = chat_rooms.peer_for(request.sid, current_user.id, receiver_id)
+    receiver = receiver or authorize_chat(receiver_id)
+    if receiver is None:
         emit('error', {'msg': 'Vous n\'êtes pas matchés'})
         return
     
-    message = Message(
+    # Diffusion d'abord : la persistance n'est plus sur le chemin de la latence perçue.
+    created_at = datetime.utcnow()
+    emit('receive_message', {
+        'sender_id': current_user.id,
+        'sender_username': current_user.username,
+        'content': content,
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S')
+    }, room=room)
+    
+    db.session.add(Message(
         sender_id=current_user.id,
         receiver_id=receiver_id,
-        content=content
-    )
-    db.session.add(message)
-    db.session.commit()
-    
+        content=content,
+        created_at=created_at
+    ))
     notif = Notification(
         user_id=receiver_id,
         type='message',
         content=f'Nouveau message de {current_user.username}',
-        related_user_id=current_user.id
+        related_user_id=current_user.id,
+        created_at=created_at
     )
     db.session.add(notif)
-    db.session.commit()
-    
-    room = f"chat_{min(current_user.id, receiver_id)}_{max(current_user.id, receiver_id)}"
-    emit('receive_message', {
-        'sender_id': current_user.id,
-        'sender_username': current_user.username,
-        'content': content,
-        'created_at': message.created_at.strftime('%Y-%m-%d %H:%M:%S')
-    }, room=room)
-    
-    send_message_email(current_user, User.query.get(receiver_id))
+    outbox.queue_message_email(current_user, receiver)
+    try:
+        db.session.flush()
+        pushed = notification_events(notif)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('Message de %s à %s non enregistré', current_user.id, receiver_id)
+        emit('error', {'msg': 'Le message n\'a pas pu être enregistré'})
+        return
+    stats_counters.incr('messages')
+    push_notifications(pushed)
 
 
 def get_recommendations(user):
     if not user.profile:
         return []
     
-    blocked_users = [block.blocked_id for block in user.blocks_made.all()]
-    blocked_by = [block.blocker_id for block in user.blocks_received.all()]
-    liked_users = [like.liked_id for like in user.likes_given.all()]
-    all_excluded = list(set(blocked_users + blocked_by + liked_users + [user.id]))
-    
-    candidates = User.query.join(Profile).filter(
-        User.id.notin_(all_excluded),
-        Profile.looking_for.in_([user.profile.gender, 'tous'])
-    ).all()
-    
-    if user.profile.looking_for != 'tous':
-        candidates = [c for c in candidates if c.profile.gender == user.profile.looking_for]
-    
-    scored_candidates = []
-    for candidate in candidates:
-        score = 0
-        
-        if user.profile.latitude and user.profile.longitude and candidate.profile.latitude and candidate.profile.longitude:
-            distance = user.profile.get_distance(candidate.profile)
-            if distance:
-                if distance < 10:
-                    score += 50
-                elif distance < 50:
-                    score += 30
-                elif distance < 100:
-                    score += 10
-        
-        age_diff = abs(user.profile.get_age() - candidate.profile.get_age())
-        if age_diff < 5:
-            score += 30
-        elif age_diff < 10:
-            score += 15
-        
-        user_interests = set([i.id for i in user.profile.interests])
-        candidate_interests = set([i.id for i in candidate.profile.interests])
-        common_interests = len(user_interests & candidate_interests)
-        score += common_interests * 10
-        
-        scored_candidates.append((candidate, score))
-    
-    scored_candidates.sort(key=lambda x: x[1], reverse=True)
-    return [c[0] for c in scored_candidates[:12]]
-
-
-def send_match_email(user1, user2):
-    if not app.config['MAIL_USERNAME']:
-        return
-    
-    try:
-        msg = EmailMessage(
-            subject='Nouveau match sur Onlyz !',
-            recipients=[user1.email]
-        )
-        msg.body = f'''Félicitations {user1.username} !
-
-Vous avez un nouveau match avec {user2.username} !
-
-Connectez-vous maintenant pour commencer à discuter :
-{url_for('chat', user_id=user2.id, _external=True)}
-
-L'équipe Onlyz
-'''
-        mail.send(msg)
-    except:
-        pass
-
-
-def send_message_email(sender, receiver):
-    if not app.config['MAIL_USERNAME']:
-        return
+    ranked_ids = recommendation_cache.get(user.id, RECOMMENDATIONS_PER_PAGE)
+    if ranked_ids is None:
+        ranked_ids = rank_recommendations(user)
+        recommendation_cache.store(user.id, ranked_ids)
+        db.session.commit()
+        ranked_ids = ranked_ids[:RECOMMENDATIONS_PER_PAGE]
     
-    try:
-        msg = EmailMessage(
-            subject='Nouveau message sur Onlyz',
-            recipients=[receiver.email]
-        )
-        msg.body = f'''Bonjour {receiver.username},
-
-Vous avez reçu un nouveau message de {sender.username} !
+    # Un candidat loin de l'utilisateur n'invalide pas son cache en changeant de
+    # genre ou de recherche : la compatibilité est revérifiée au chargement.
+    users_by_id = {u.id: u for u in User.query.join(Profile).options(db.contains_eager(User.profile)).filter(
+        User.id.in_(ranked_ids),
+        compatibility_clause(user.profile)
+    )}
+    return [users_by_id[user_id] for user_id in ranked_ids if user_id in users_by_id]
 
-Connectez-vous pour le lire :
-{url_for('chat', user_id=sender.id, _external=True)}
 
-L'équipe Onlyz
-'''
-        mail.send(msg)
-    except:
-        pass
+def rank_recommendations(user):
+    return rank_candidates(user, limit=app.config['RECOMMENDATION_CACHE_DEPTH'])
 
 
 if __name__ == '__main__':
@@ -716,9 +1274,9 @@ if __name__ == '__main__':
                 username='admin',
                 email='admin@onlyz.com',
                 is_admin=True,
-                accepted_terms=True
+                accepted_terms=True,
+                password_hash=password_hasher.hash(admin_password)
             )
-            admin.set_password(admin_password)
             db.session.add(admin)
             db.session.commit()
     port = int(os.environ.get('PORT', 10000))
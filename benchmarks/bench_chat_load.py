@@ -0,0 +1,263 @@
+"""Test de charge du chat Socket.IO avec des clients simulés.
+
+Lance l'application dans un processus serveur séparé (mode asynchrone
+threading, eventlet ou gevent) sur une base SQLite temporaire contenant N
+paires matchées. Chaque utilisateur se connecte par le formulaire /login,
+puis ouvre un client python-socketio avec son cookie de session et rejoint
+(join acquitté) le salon de sa conversation. Chaque expéditeur envoie
+ensuite des messages à débit fixe pendant --duration secondes, sans
+attendre les réponses (charge en boucle ouverte).
+
+Mesure la latence de bout en bout (envoi -> receive_message chez le
+destinataire) en percentiles, les messages perdus, les erreurs renvoyées
+par le serveur et le CPU consommé par le processus serveur. Tout tourne en
+local, sans réseau ni service externe.
+
+Nécessite les dépendances du client python-socketio, et eventlet ou gevent
+(avec gevent-websocket) pour ces modes :
+pip install requests websocket-client
+pip install eventlet gevent gevent-websocket
+
+    python benchmarks/bench_chat_load.py --pairs 20 --rate 5 --duration 20
+    python benchmarks/bench_chat_load.py --async-mode threading eventlet gevent --output results/chat.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'benchmark'
+
+
+def serve(port, n_pairs, async_mode):
+    # Le monkey patching doit précéder tout autre import.
+    if async_mode == 'eventlet':
+        import eventlet
+        eventlet.monkey_patch()
+    elif async_mode == 'gevent':
+        from gevent import monkey
+        monkey.patch_all()
+
+    import logging
+    sys.path.insert(0, ROOT)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'chat_load.db')
+    os.environ['SOCKETIO_ASYNC_MODE'] = async_mode
+    os.environ.setdefault('RECOMMENDATION_PRECOMPUTE_INTERVAL', '0')
+
+    from werkzeug.security import generate_password_hash
+    from bench_messages import make_pairs
+    from app import app, socketio
+    from models import db, User
+
+    with app.app_context():
+        db.create_all()
+        make_pairs(n_pairs)
+        User.query.update({'password_hash': generate_password_hash(PASSWORD), 'accepted_terms': True})
+        db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.CRITICAL)
+    logging.getLogger('onlyz.sql').setLevel(logging.ERROR)
+    print(f'prêt ({socketio.async_mode})', flush=True)
+    socketio.run(app, host='127.0.0.1', port=port, log_output=False, allow_unsafe_werkzeug=True)
+
+
+def cpu_seconds(pid):
+    """Temps CPU (utilisateur + système) du processus, lu dans /proc ; None hors Linux."""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def login(base_url, user_id):
+    import requests
+
+    session = requests.Session()
+    page = session.get(f'{base_url}/login').text
+    token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+    response = session.post(f'{base_url}/login', allow_redirects=False, data={
+        'csrf_token': token,
+        'email': f'bench{user_id - 1}@example.com',
+        'password': PASSWORD,
+    })
+    if response.status_code != 302 or 'session' not in session.cookies:
+        raise RuntimeError(f'Connexion refusée pour bench{user_id - 1}')
+    return 'session=' + session.cookies['session']
+
+
+def connect(base_url, cookie, room, transports, handlers=None):
+    import socketio
+
+    client = socketio.Client()
+    for event, handler in (handlers or {}).items():
+        client.on(event, handler)
+    client.connect(base_url, headers={'Cookie': cookie}, transports=transports)
+    client.call('join', {'room': room}, timeout=30)
+    return client
+
+
+def run(async_mode, args, load=None):
+    base_url = f'http://127.0.0.1:{args.port}'
+    # Journal du serveur à part ; sans gevent-websocket, pywsgi y signale chaque fermeture de websocket.
+    log_path = os.path.join(tempfile.gettempdir(), f'bench_chat_load_{async_mode}.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port),
+             '--pairs', str(args.pairs), '--async-mode', async_mode],
+            stdout=subprocess.PIPE, stderr=log, text=True
+        )
+        try:
+            ready = server.stdout.readline().strip()
+            if not ready.startswith('prêt'):
+                raise RuntimeError(f'Le serveur {async_mode} n\'a pas démarré, voir {log_path}')
+            time.sleep(0.5)
+            # Port déjà pris par un autre serveur : le nôtre s'arrête aussitôt.
+            if server.poll() is not None:
+                raise RuntimeError(f'Le serveur {async_mode} s\'est arrêté, voir {log_path}')
+            return drive(async_mode, ready, server.pid, base_url, args, load)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def drive(async_mode, ready, server_pid, base_url, args, load=None):
+    # Comptes créés par make_pairs dans l'ordre : la paire i est (2i + 1, 2i + 2).
+    pairs = [(2 * i + 1, 2 * i + 2) for i in range(args.pairs)]
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def on_message(data):
+        received_at = time.time()
+        sent_at = float(data['content'].rsplit(' ', 1)[1])
+        with lock:
+            latencies.append(received_at - sent_at)
+
+    def on_error(data):
+        with lock:
+            errors.append(data.get('msg'))
+
+    senders, receivers = [], []
+    for sender_id, receiver_id in pairs:
+        room = f'chat_{sender_id}_{receiver_id}'
+        receivers.append(connect(base_url, login(base_url, receiver_id), room, args.transports,
+                                 {'receive_message': on_message}))
+        senders.append((connect(base_url, login(base_url, sender_id), room, args.transports,
+                                {'error': on_error}), receiver_id))
+
+    n_messages = int(args.rate * args.duration)
+    sent = [0] * len(senders)
+
+    def send_loop(index, client, receiver_id):
+        # Envois programmés à intervalle fixe, décalés d'une paire à l'autre.
+        interval = 1 / args.rate
+        start = time.monotonic() + index * interval / len(senders)
+        for k in range(n_messages):
+            delay = start + k * interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            client.emit('send_message', {'receiver_id': receiver_id, 'content': f'{k} {time.time()}'})
+            sent[index] += 1
+
+    # Charge annexe (connexions de bench_login.py) pendant l'envoi seulement.
+    if load:
+        load.start(base_url)
+    cpu_before, wall_before = cpu_seconds(server_pid), time.monotonic()
+    threads = [threading.Thread(target=send_loop, args=(i, client, receiver_id))
+               for i, (client, receiver_id) in enumerate(senders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    sending = time.monotonic() - wall_before
+    if load:
+        load.stop()
+
+    deadline = time.monotonic() + args.drain
+    while time.monotonic() < deadline:
+        with lock:
+            if len(latencies) + len(errors) >= sum(sent):
+                break
+        time.sleep(0.05)
+    cpu_after, wall_after = cpu_seconds(server_pid), time.monotonic()
+
+    # Déconnexions en parallèle et bornées : le client attend la trame de
+    # fermeture du serveur, que pywsgi sans gevent-websocket ne renvoie pas.
+    closers = [threading.Thread(target=client.disconnect, daemon=True)
+               for client in [c for c, _ in senders] + receivers]
+    for closer in closers:
+        closer.start()
+    for closer in closers:
+        closer.join(timeout=5)
+
+    total = sum(sent)
+    ms = np.array(latencies) * 1000
+    result = {
+        'async_mode': async_mode,
+        'server': ready,
+        'pairs': args.pairs,
+        'rate_per_pair': args.rate,
+        'sent': total,
+        'delivered': len(latencies),
+        'dropped': total - len(latencies),
+        'errors': len(errors),
+        'send_rate': round(total / sending, 1),
+        'latency_ms': {
+            name: round(float(np.percentile(ms, q)), 2) if len(ms) else None
+            for name, q in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+        },
+        'server_cpu': None,
+    }
+    if cpu_before is not None:
+        result['server_cpu'] = round((cpu_after - cpu_before) / (wall_after - wall_before), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--async-mode', nargs='+', default=['threading'],
+                        choices=['threading', 'eventlet', 'gevent'])
+    parser.add_argument('--pairs', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=5, help='messages par seconde et par conversation')
+    parser.add_argument('--duration', type=float, default=20, help="durée d'envoi en secondes")
+    parser.add_argument('--drain', type=float, default=30, help='attente maximale des derniers messages')
+    parser.add_argument('--transports', nargs='+', default=['websocket'], choices=['websocket', 'polling'])
+    parser.add_argument('--port', type=int, default=5200)
+    parser.add_argument('--output', help='fichier JSON de résultats')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.pairs, args.async_mode[0])
+        return
+
+    print(f'{os.cpu_count()} CPU disponibles, {args.pairs} conversations à {args.rate:g} msg/s '
+          f'pendant {args.duration:g}s')
+    results = []
+    for async_mode in args.async_mode:
+        result = run(async_mode, args)
+        results.append(result)
+        latency = result['latency_ms']
+        cpu = f"{result['server_cpu']:.0%}" if result['server_cpu'] is not None else '-'
+        print(f"{async_mode:<10} {result['delivered']}/{result['sent']} reçus, {result['dropped']} perdus, "
+              f"{result['errors']} erreurs, {result['send_rate']} msg/s envoyés | latence p50 {latency['p50']} ms, "
+              f"p95 {latency['p95']} ms, p99 {latency['p99']} ms, max {latency['max']} ms | CPU serveur {cpu}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
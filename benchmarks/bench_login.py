@@ -0,0 +1,134 @@
+"""Débit des connexions et latence du chat pendant une rafale de connexions.
+
+Reprend le serveur et la charge de bench_chat_load.py (N conversations à
+débit fixe) et ajoute, pendant l'envoi des messages, des clients qui se
+connectent en boucle par /login. Chaque configuration de
+PASSWORD_HASH_WORKERS est mesurée dans un serveur neuf : 0 calcule les
+hashes dans le worker (bloque la boucle eventlet/gevent), N > 0 les
+confie au pool de processus.
+
+Rapporte les connexions réussies par seconde, leur latence, les refus
+(503 quand la file de hachage est pleine) et la latence du chat mesurée
+en même temps.
+
+    python benchmarks/bench_login.py --async-mode eventlet --hash-workers 0 2
+    python benchmarks/bench_login.py --async-mode gevent --hash-workers 0 1 2 --login-clients 16
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_chat_load  # noqa: E402
+
+
+class LoginFlood:
+    """Clients qui enchaînent GET /login puis POST /login jusqu'à stop()."""
+
+    def __init__(self, clients, n_users):
+        self.clients = clients
+        self.n_users = n_users
+        self.latencies = []
+        self.rejected = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self, base_url):
+        self.started = time.monotonic()
+        self._threads = [threading.Thread(target=self._loop, args=(base_url, i), daemon=True)
+                         for i in range(self.clients)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self.elapsed = time.monotonic() - self.started
+
+    def _loop(self, base_url, index):
+        import requests
+
+        k = index
+        while not self._stop.is_set():
+            session = requests.Session()
+            page = session.get(f'{base_url}/login').text
+            token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', page).group(1)
+            start = time.perf_counter()
+            response = session.post(f'{base_url}/login', allow_redirects=False, data={
+                'csrf_token': token,
+                'email': f'bench{k % self.n_users}@example.com',
+                'password': bench_chat_load.PASSWORD,
+            })
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                if response.status_code == 302:
+                    self.latencies.append(elapsed)
+                elif response.status_code == 503:
+                    self.rejected += 1
+                else:
+                    self.failed += 1
+            k += self.clients
+
+    def result(self):
+        ms = np.array(self.latencies) * 1000
+        return {
+            'clients': self.clients,
+            'logins': len(self.latencies),
+            'logins_per_s': round(len(self.latencies) / self.elapsed, 1),
+            'rejected': self.rejected,
+            'failed': self.failed,
+            'latency_ms': {
+                name: round(float(np.percentile(ms, q)), 1) if len(ms) else None
+                for name, q in (('p50', 50), ('p95', 95), ('max', 100))
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--async-mode', default='eventlet', choices=['threading', 'eventlet', 'gevent'])
+    parser.add_argument('--hash-workers', type=int, nargs='+', default=[0, 2],
+                        help='valeurs de PASSWORD_HASH_WORKERS à comparer')
+    parser.add_argument('--login-clients', type=int, default=8, help='clients qui se connectent en boucle')
+    parser.add_argument('--pairs', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=5, help='messages par seconde et par conversation')
+    parser.add_argument('--duration', type=float, default=15, help="durée d'envoi en secondes")
+    parser.add_argument('--drain', type=float, default=30, help='attente maximale des derniers messages')
+    parser.add_argument('--port', type=int, default=5210)
+    parser.add_argument('--output', help='fichier JSON de résultats')
+    args = parser.parse_args()
+    args.transports = ['websocket']
+
+    print(f'{os.cpu_count()} CPU disponibles, {args.login_clients} clients de connexion, '
+          f'{args.pairs} conversations à {args.rate:g} msg/s pendant {args.duration:g}s ({args.async_mode})')
+    results = []
+    for workers in args.hash_workers:
+        # Hérité par le processus serveur.
+        os.environ['PASSWORD_HASH_WORKERS'] = str(workers)
+        flood = LoginFlood(args.login_clients, 2 * args.pairs)
+        chat = bench_chat_load.run(args.async_mode, args, load=flood)
+        login = flood.result()
+        results.append({'hash_workers': workers, 'login': login, 'chat': chat})
+        chat_latency, login_latency = chat['latency_ms'], login['latency_ms']
+        print(f"workers {workers} | {login['logins_per_s']} connexions/s (p50 {login_latency['p50']} ms, "
+              f"p95 {login_latency['p95']} ms), {login['rejected']} refusées, {login['failed']} en échec | "
+              f"chat {chat['delivered']}/{chat['sent']} reçus, p50 {chat_latency['p50']} ms, "
+              f"p95 {chat_latency['p95']} ms, p99 {chat_latency['p99']} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Benchmark du handler Socket.IO send_message.
+
+Crée une base SQLite temporaire avec des paires matchées, joint chaque salon
+puis envoie des messages en boucle depuis le client de test Flask-SocketIO.
+Mesure le débit soutenu (messages/s pour un worker) et le nombre de requêtes
+SQL par message.
+
+    python benchmarks/bench_messages.py --messages 2000 --pairs 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Toujours une base temporaire : elle est vidée et recréée, quel que soit DATABASE_URL.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench_messages.db')
+
+from sqlalchemy import event  # noqa: E402
+
+from app import app, socketio  # noqa: E402
+from models import db, User, Match, Message  # noqa: E402
+
+
+def make_pairs(n_pairs):
+    users = []
+    for i in range(n_pairs * 2):
+        user = User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='x')
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+    for i in range(n_pairs):
+        user_a_id, user_b_id = Match.ordered(users[2 * i].id, users[2 * i + 1].id)
+        db.session.add(Match(user_a_id=user_a_id, user_b_id=user_b_id))
+    db.session.commit()
+    return [(users[2 * i].id, users[2 * i + 1].id) for i in range(n_pairs)]
+
+
+def connect(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return socketio.test_client(app, flask_test_client=client)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--pairs', type=int, default=20)
+    args = parser.parse_args()
+
+    app.config['MAIL_ENABLED'] = True
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        pairs = make_pairs(args.pairs)
+
+    clients = []
+    for sender_id, receiver_id in pairs:
+        client = connect(sender_id)
+        client.emit('join', {'room': f'chat_{min(sender_id, receiver_id)}_{max(sender_id, receiver_id)}'})
+        client.get_received()
+        clients.append((client, receiver_id))
+
+    statements = 0
+
+    def count(*_):
+        nonlocal statements
+        statements += 1
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+
+    start = time.perf_counter()
+    for i in range(args.messages):
+        client, receiver_id = clients[i % len(clients)]
+        client.emit('send_message', {'receiver_id': receiver_id, 'content': f'message {i}'})
+    elapsed = time.perf_counter() - start
+    event.remove(engine, 'before_cursor_execute', count)
+
+    with app.app_context():
+        stored = Message.query.count()
+    print(f'{args.messages} messages en {elapsed:.2f}s : {args.messages / elapsed:.0f} msg/s, '
+          f'{statements / args.messages:.1f} requêtes/message ({stored} enregistrés)')
+
+
+if __name__ == '__main__':
+    main()
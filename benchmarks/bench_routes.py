@@ -0,0 +1,214 @@
+"""Benchmark de bout en bout des routes principales.
+
+Génère une base avec datagen.py, puis appelle chaque route avec le client de test Flask pour un
+ensemble d'utilisateurs témoins : parcourir (première page et page
+profonde), recherche (filtres et mots-clés), recommandations, matchs,
+chat, like/unlike et notifications. Mesure la latence (p50, p95) et le
+nombre de requêtes SQL par appel (en-tête X-Query-Count de QueryProfiler),
+écrit les résultats en JSON et les compare à un fichier précédent.
+
+Comme pour datagen.py, la base est un fichier SQLite temporaire sauf avec
+--database-url, qui doit désigner une base vide (ou --reset pour la vider,
+ou --reuse pour mesurer sur les données qu'elle contient déjà).
+
+    python benchmarks/bench_routes.py --users 10000 --output results/sqlite-10k.json
+    python benchmarks/bench_routes.py --database-url postgresql://localhost/onlyz_bench --users 100000
+    python benchmarks/bench_routes.py --database-url postgresql://localhost/onlyz_bench --reuse \
+        --compare results/pg-100k.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datagen import add_database_arguments, database_url, generate, prepare, probe_users  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=50, help='appels mesurés par route')
+    parser.add_argument('--probes', type=int, default=10, help='utilisateurs témoins en rotation')
+    parser.add_argument('--reuse', action='store_true', help='mesurer sur les données de --database-url')
+    parser.add_argument('--output', help='fichier JSON de résultats')
+    parser.add_argument('--compare', help='résultats précédents à comparer')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='hausse de p95 tolérée (0.2 = 20 %%)')
+    add_database_arguments(parser)
+    args = parser.parse_args()
+    if (args.reuse or args.reset) and not args.database_url:
+        parser.error('--reuse et --reset exigent --database-url')
+    if args.reuse and args.reset:
+        parser.error('--reuse et --reset sont incompatibles')
+    return args
+
+
+# Lus avant le premier import de app, qui lit DATABASE_URL.
+args = parse_args()
+os.environ['DATABASE_URL'] = database_url(args.database_url, 'bench_routes')
+# Pas de précalcul en tâche de fond : les recommandations sont mesurées sur le chemin de la requête.
+os.environ.setdefault('RECOMMENDATION_PRECOMPUTE_INTERVAL', '0')
+
+import app as application  # noqa: E402
+from app import app, stats_counters  # noqa: E402
+from models import db, User  # noqa: E402
+import exclusions  # noqa: E402
+import pagination  # noqa: E402
+
+
+def routes(probe, deep_cursor):
+    partner_id = probe['partner_id']
+    return {
+        'browse': ('GET', '/browse'),
+        'browse_deep': ('GET', f'/browse?after={deep_cursor}'),
+        'search': ('GET', '/search?gender=femme&min_age=25&max_age=40&max_distance=50'),
+        'search_keywords': ('GET', '/search?gender=&min_age=18&max_age=99&max_distance=100&keywords=musique'),
+        'recommendations': ('GET', '/recommendations'),
+        'matches': ('GET', '/matches'),
+        'chat': ('GET', f'/chat/{partner_id}'),
+        # Deux appels par itération (like puis unlike) : la base reste dans le même état.
+        'like_user': ('POST', f"/like/{probe['like_target']}"),
+        'notifications': ('GET', '/notifications'),
+    }
+
+
+def login(user_id):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def measure(n_requests, probes, deep_cursor):
+    samples = {}
+    clients = [(login(probe['user_id']), probe) for probe in probes]
+    for i in range(n_requests + 1):
+        client, probe = clients[i % len(clients)]
+        for name, (method, path) in routes(probe, deep_cursor).items():
+            calls = 2 if method == 'POST' else 1
+            for _ in range(calls):
+                start = time.perf_counter()
+                response = client.open(path, method=method)
+                elapsed = time.perf_counter() - start
+                if response.status_code >= 400:
+                    raise RuntimeError(f'{name} : HTTP {response.status_code} pour {path}')
+                # Premier passage : caches froids, non compté.
+                if i:
+                    sample = samples.setdefault(name, {'ms': [], 'queries': []})
+                    sample['ms'].append(elapsed * 1000)
+                    sample['queries'].append(int(response.headers['X-Query-Count']))
+    return {
+        name: {
+            'calls': len(sample['ms']),
+            'p50_ms': round(float(np.percentile(sample['ms'], 50)), 2),
+            'p95_ms': round(float(np.percentile(sample['ms'], 95)), 2),
+            'mean_ms': round(float(np.mean(sample['ms'])), 2),
+            'queries_mean': round(float(np.mean(sample['queries'])), 1),
+            'queries_max': int(max(sample['queries'])),
+        }
+        for name, sample in samples.items()
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous, tolerance):
+    regressions = []
+    print(f"\n{'route':<18} {'p95 avant':>10} {'p95 après':>10} {'écart':>8} {'requêtes':>12}")
+    for name, row in results.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        change = row['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0
+        flag = ''
+        if change > tolerance or row['queries_max'] > old['queries_max']:
+            regressions.append(name)
+            flag = ' <-'
+        print(f"{name:<18} {old['p95_ms']:>10.2f} {row['p95_ms']:>10.2f} {change:>+8.0%} "
+              f"{old['queries_max']:>5} -> {row['queries_max']:<4}{flag}")
+    return regressions
+
+
+def main():
+    # Les tâches de fond (géocodage, statistiques...) fausseraient les mesures.
+    application._background_started = True
+    app.debug = True
+    # Les dépassements de budget sont déjà dans le tableau de résultats.
+    logging.getLogger('onlyz.sql').setLevel(logging.ERROR)
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if not args.reuse:
+            prepare(args.reset)
+            print(f'Génération de {args.users} utilisateurs ({dialect})')
+            dataset = generate(args.users, seed=args.seed)
+        else:
+            dataset = {'users': db.session.query(db.func.count(User.id)).scalar()}
+        stats_counters.reconcile()
+        probes = probe_users(args.probes)
+        for probe in probes:
+            # Utilisateur ni liké ni bloqué : like puis unlike laissent la base inchangée.
+            probe['like_target'] = db.session.scalar(
+                db.select(User.id).where(exclusions.exclusion_clause(probe['user_id'], include_likes=True))
+                .order_by(User.id).limit(1)
+            )
+        # Curseur au milieu de la liste : une page « profonde » de /browse.
+        middle = db.session.execute(
+            db.select(User.created_at, User.id).order_by(User.created_at.desc(), User.id.desc())
+            .offset(dataset['users'] // 2).limit(1)
+        ).one()
+        deep_cursor = pagination.encode_cursor(*middle)
+
+    results = measure(args.requests, probes, deep_cursor)
+
+    print(f"\n{'route':<18} {'p50 (ms)':>9} {'p95 (ms)':>9} {'requêtes':>9} {'max':>5}")
+    for name, row in results.items():
+        print(f"{name:<18} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['queries_mean']:>9.1f} "
+              f"{row['queries_max']:>5}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({
+                'meta': {
+                    'date': datetime.utcnow().isoformat(timespec='seconds'),
+                    'revision': git_revision(),
+                    'database': dialect,
+                    'python': platform.python_version(),
+                    'cpus': os.cpu_count(),
+                    'seed': args.seed,
+                    'requests': args.requests,
+                    'dataset': dataset,
+                },
+                'routes': results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f'\nRésultats écrits dans {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)['routes']
+        regressions = compare(results, previous, args.tolerance)
+        if regressions:
+            print(f"\nRégressions : {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
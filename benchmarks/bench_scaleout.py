@@ -0,0 +1,175 @@
+"""Test multi-processus de la diffusion Socket.IO à travers la file de messages.
+
+Lance le broker local de socket_broker.py (ou utilise --queue redis://...),
+puis N serveurs Socket.IO, chacun avec sa propre base SQLite (mêmes
+utilisateurs et matchs) pour isoler la couche Socket.IO. L'expéditeur de
+chaque conversation est connecté à un worker et le destinataire au worker
+suivant : chaque message doit traverser la file pour arriver. Mesure le
+débit agrégé de bout en bout selon le nombre de workers et vérifie qu'aucun
+message n'est perdu.
+
+Nécessite les dépendances du client python-socketio :
+pip install requests websocket-client
+
+    python benchmarks/bench_scaleout.py --workers 1 2 4 --pairs 8 --messages 250
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import socketio
+from flask import Flask
+from flask.sessions import SecureCookieSessionInterface
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from socket_broker import serve  # noqa: E402
+
+SECRET = 'bench-scaleout'
+
+
+def run_server(port, n_pairs, queue_url, ready):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'worker{port}.db')
+    os.environ['SOCKETIO_MESSAGE_QUEUE'] = queue_url
+    os.environ['SESSION_SECRET'] = SECRET
+
+    from bench_messages import make_pairs
+    from app import app, socketio as server
+    from models import db
+
+    with app.app_context():
+        db.create_all()
+        make_pairs(n_pairs)
+    ready.set()
+    # Le serveur de développement journalise chaque fermeture de websocket comme une erreur.
+    logging.getLogger('werkzeug').setLevel(logging.CRITICAL)
+    server.run(app, host='127.0.0.1', port=port, log_output=False, allow_unsafe_werkzeug=True)
+
+
+def session_cookie(user_id):
+    signer = Flask('bench')
+    signer.secret_key = SECRET
+    serializer = SecureCookieSessionInterface().get_signing_serializer(signer)
+    return 'session=' + serializer.dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+def connect(port, user_id, room, on_message=None):
+    client = socketio.Client()
+    if on_message:
+        client.on('receive_message', on_message)
+    client.connect(f'http://127.0.0.1:{port}', headers={'Cookie': session_cookie(user_id)},
+                   transports=['websocket'])
+    # Appel acquitté : le salon est rejoint avant le premier message.
+    client.call('join', {'room': room})
+    return client
+
+
+def run_clients(index, ports, pairs, n_messages, barrier, results):
+    n_workers = len(ports)
+    received = 0
+    lock = threading.Lock()
+    done = threading.Event()
+
+    senders, receivers = [], []
+    for p, (sender_id, receiver_id) in enumerate(pairs):
+        room = f'chat_{min(sender_id, receiver_id)}_{max(sender_id, receiver_id)}'
+        if p % n_workers == index:
+            senders.append((connect(ports[index], sender_id, room), receiver_id))
+        if (p + 1) % n_workers == index:
+            receivers.append(receiver_id)
+
+    expected = n_messages * len(receivers)
+
+    def on_message(data):
+        nonlocal received
+        with lock:
+            received += 1
+            if received >= expected:
+                done.set()
+
+    listeners = []
+    for p, (sender_id, receiver_id) in enumerate(pairs):
+        if (p + 1) % n_workers == index:
+            room = f'chat_{min(sender_id, receiver_id)}_{max(sender_id, receiver_id)}'
+            listeners.append(connect(ports[index], receiver_id, room, on_message))
+    if not expected:
+        done.set()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for i in range(n_messages):
+        for client, receiver_id in senders:
+            client.emit('send_message', {'receiver_id': receiver_id, 'content': f'message {i}'})
+    done.wait(120)
+    elapsed = time.perf_counter() - start
+
+    for client in [c for c, _ in senders] + listeners:
+        client.disconnect()
+    results.put((n_messages * len(senders), received, expected, elapsed))
+
+
+def run(n_workers, n_pairs, n_messages, queue_url, base_port):
+    context = multiprocessing.get_context('spawn')
+    ports = [base_port + i for i in range(n_workers)]
+    servers = []
+    for port in ports:
+        ready = context.Event()
+        server = context.Process(target=run_server, args=(port, n_pairs, queue_url, ready), daemon=True)
+        server.start()
+        ready.wait()
+        servers.append(server)
+    time.sleep(1)
+
+    # Les comptes sont créés dans le même ordre sur chaque worker : mêmes identifiants partout.
+    pairs = [(2 * i + 1, 2 * i + 2) for i in range(n_pairs)]
+    barrier = context.Barrier(n_workers)
+    results = context.Queue()
+    clients = [
+        context.Process(target=run_clients, args=(i, ports, pairs, n_messages, barrier, results))
+        for i in range(n_workers)
+    ]
+    for client in clients:
+        client.start()
+    rows = [results.get() for _ in clients]
+    for process in clients + servers:
+        process.terminate()
+        process.join()
+
+    sent = sum(row[0] for row in rows)
+    received = sum(row[1] for row in rows)
+    expected = sum(row[2] for row in rows)
+    elapsed = max(row[3] for row in rows)
+    print(f'{n_workers} worker(s) : {sent} messages en {elapsed:.2f}s, {sent / elapsed:.0f} msg/s, '
+          f'{received}/{expected} reçus')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--pairs', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=250, help='messages par conversation')
+    parser.add_argument('--queue', help='file existante (redis://...) ; par défaut, broker local')
+    parser.add_argument('--port', type=int, default=5100, help='port du premier worker')
+    args = parser.parse_args()
+
+    queue_url = args.queue
+    if not queue_url:
+        ready = threading.Event()
+        threading.Thread(target=serve, args=('127.0.0.1', 5790, ready), daemon=True).start()
+        ready.wait()
+        queue_url = 'local://127.0.0.1:5790'
+
+    print(f'{os.cpu_count()} CPU disponibles')
+    for n_workers in args.workers:
+        run(n_workers, args.pairs, args.messages, queue_url, args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark du moteur de score des recommandations (scoring.py).
+
+Compare le calcul vectorisé à la boucle Python historique (geodesic par
+paire) sur des pools synthétiques, et vérifie que le classement est identique.
+
+    python benchmarks/bench_scoring.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import numpy as np
+from geopy.distance import geodesic
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring import CandidatePool, score_pool, top_k, ages_on  # noqa: E402
+
+
+def make_pool(n, n_interests, rng):
+    # Population regroupée autour de quelques villes, comme en production.
+    centers = np.array([(48.85, 2.35), (45.76, 4.84), (43.30, 5.37), (50.85, 4.35), (4.32, 15.31)])
+    city = rng.integers(0, len(centers), n)
+    latitude = centers[city, 0] + rng.normal(0, 0.6, n)
+    longitude = centers[city, 1] + rng.normal(0, 0.6, n)
+    latitude[rng.random(n) < 0.1] = np.nan
+
+    birth_year = rng.integers(1960, 2006, n)
+    birth_md = rng.integers(1, 13, n) * 100 + rng.integers(1, 29, n)
+
+    n_words = (n_interests + 63) // 64
+    bits = np.zeros((n, n_words), dtype=np.uint64)
+    for _ in range(4):
+        pos = rng.integers(0, n_interests, n).astype(np.uint64)
+        np.bitwise_or.at(bits, (np.arange(n), (pos // 64).astype(np.int64)), np.uint64(1) << (pos % 64))
+    return CandidatePool(np.arange(1, n + 1), latitude, longitude, birth_year, birth_md, bits)
+
+
+def legacy_ranking(pool, latitude, longitude, age, interest_bits, today, limit):
+    scored = []
+    ages = ages_on(today, pool.birth_year, pool.birth_md)
+    for i in range(len(pool)):
+        score = 0
+        lat, lon = pool.latitude[i], pool.longitude[i]
+        if latitude and longitude and not np.isnan(lat) and lat and lon:
+            distance = geodesic((latitude, longitude), (lat, lon)).kilometers
+            if distance:
+                if distance < 10:
+                    score += 50
+                elif distance < 50:
+                    score += 30
+                elif distance < 100:
+                    score += 10
+
+        age_diff = abs(age - int(ages[i]))
+        if age_diff < 5:
+            score += 30
+        elif age_diff < 10:
+            score += 15
+
+        common = int(np.bitwise_count(pool.interest_bits[i] & interest_bits).sum())
+        score += common * 10
+        scored.append((int(pool.user_ids[i]), score))
+
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [c[0] for c in scored[:limit]]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--legacy-max', type=int, default=10_000,
+                        help='taille maximale pour laquelle on exécute aussi la boucle historique')
+    parser.add_argument('--interests', type=int, default=40)
+    parser.add_argument('--limit', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    today = date(2025, 6, 15)
+    origin = (48.86, 2.34)
+    age = 30
+    user_bits = make_pool(1, args.interests, rng).interest_bits[0]
+
+    print(f"{'candidats':>10} {'vectorisé (ms)':>15} {'historique (ms)':>16} {'identique':>10}")
+    for n in args.sizes:
+        pool = make_pool(n, args.interests, rng)
+
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            scores = score_pool(pool, origin[0], origin[1], age, user_bits, today)
+            ranked = [int(pool.user_ids[i]) for i in top_k(scores, args.limit)]
+            timings.append(time.perf_counter() - start)
+        fast_ms = min(timings) * 1000
+
+        legacy_ms, same = '-', '-'
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            expected = legacy_ranking(pool, origin[0], origin[1], age, user_bits, today, args.limit)
+            legacy_ms = f'{(time.perf_counter() - start) * 1000:.1f}'
+            same = 'oui' if expected == ranked else 'NON'
+
+        print(f'{n:>10} {fast_ms:>15.1f} {legacy_ms:>16} {same:>10}')
+
+
+if __name__ == '__main__':
+    main()
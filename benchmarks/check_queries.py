@@ -0,0 +1,153 @@
+"""Vérifie le nombre de requêtes SQL des pages de listes et des actions courantes.
+
+Crée une base SQLite temporaire assez remplie pour que chaque page soit
+pleine (profils, centres d'intérêt, matchs), affiche chaque page avec le
+client de test Flask et relève le nombre de requêtes mesuré par
+QueryProfiler (querystats.py). Ce nombre doit rester sous le plafond de
+l'endpoint dans QUERY_BUDGETS (app.py), indépendant du nombre de cartes
+affichées : une requête par carte (chargement paresseux de user.profile)
+le ferait exploser. Le chat, le paquet de /deck/next et un like qui crée
+un match (caches froids, le cas le plus cher) sont mesurés de la même façon.
+Sort avec le code 1 si une page dépasse son plafond ; lancé aussi par
+tests/test_query_budgets.py.
+
+La base est toujours un fichier temporaire, quel que soit DATABASE_URL :
+elle est vidée et recréée à chaque passage.
+
+    python benchmarks/check_queries.py
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'check_queries.db')
+
+from app import app  # noqa: E402
+from models import db, User, Profile, Interest, Like, Match  # noqa: E402
+import fulltext  # noqa: E402
+
+# Pages et actions mesurées ; le plafond est celui de leur endpoint dans QUERY_BUDGETS.
+PAGES = [
+    '/browse',
+    '/browse?after={cursor}',
+    '/search?gender=femme&min_age=18&max_age=99&max_distance=100',
+    '/search?gender=&min_age=18&max_age=99&max_distance=100&keywords=musique',
+    '/matches',
+    '/recommendations',
+    '/chat/{partner}',
+    '/deck/next',
+    # Sans appel de préchauffage : un second like annulerait le premier.
+    'POST /like/{admirer}',
+]
+
+WORDS = ['musique', 'voyage', 'cuisine', 'cinéma', 'sport', 'lecture', 'randonnée', 'photo']
+
+
+def populate(n_users, seed=0):
+    rng = random.Random(seed)
+    interests = [Interest(name=word) for word in WORDS]
+    db.session.add_all(interests)
+    users = []
+    for i in range(n_users):
+        user = User(username=f'check{i}', email=f'check{i}@example.com', password_hash='x')
+        user.profile = Profile(
+            date_of_birth=date(1970, 1, 1) + timedelta(days=rng.randrange(365 * 35)),
+            gender='homme' if i == 0 else rng.choice(['homme', 'femme']),
+            looking_for='femme' if i == 0 else rng.choice(['homme', 'tous']),
+            bio=' '.join(rng.sample(WORDS, 3)),
+            city='Paris',
+            latitude=48.85 + rng.uniform(-0.3, 0.3),
+            longitude=2.35 + rng.uniform(-0.3, 0.3),
+            interests=rng.sample(interests, 3),
+        )
+        users.append(user)
+    db.session.add_all(users)
+    db.session.flush()
+    for other in users[1:31]:
+        user_a_id, user_b_id = Match.ordered(users[0].id, other.id)
+        db.session.add(Match(user_a_id=user_a_id, user_b_id=user_b_id))
+    # Like à rendre : le like de l'utilisateur témoin créera un match.
+    db.session.add(Like(liker_id=users[31].id, liked_id=users[0].id))
+    fulltext.refresh()
+    db.session.commit()
+    return {'user_id': users[0].id, 'partner': users[1].id, 'admirer': users[31].id}
+
+
+def budget_for(method, path):
+    endpoint, _ = app.url_map.bind('localhost').match(path.split('?')[0], method=method)
+    return app.config['QUERY_BUDGETS'][endpoint]
+
+
+def measure(n_users=300):
+    """Mesure chaque page de PAGES ; renvoie une ligne par page, dans l'ordre."""
+    # app importé avant ce module (tests) : on ne vide qu'une base SQLite temporaire.
+    url = app.config['SQLALCHEMY_DATABASE_URI']
+    if not url.startswith('sqlite:///' + tempfile.gettempdir()):
+        raise RuntimeError(f'Base inattendue ({url}) : check_queries ne tourne que sur une base temporaire')
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        ids = populate(n_users)
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(ids['user_id'])
+        session['_fresh'] = True
+
+    # En mode debug, QueryProfiler renvoie le nombre de requêtes de la page en en-tête.
+    debug, app.debug = app.debug, True
+    results = []
+    cursor = None
+    try:
+        for page in PAGES:
+            method, _, path = page.rpartition(' ')
+            method = method or 'GET'
+            if '{cursor}' in path:
+                if not cursor:
+                    continue
+                path = path.format(cursor=cursor)
+            path = path.format(**ids)
+            if method == 'GET':
+                client.get(path)  # premier affichage : caches de recommandations et d'exclusions
+            response = client.open(path, method=method)
+            html = response.get_data(as_text=True)
+            statements = int(response.headers['X-Query-Count'])
+            budget = budget_for(method, path)
+            results.append({
+                'page': page,
+                'method': method,
+                'path': path,
+                'statements': statements,
+                'budget': budget,
+                'status': response.status_code,
+                'cards': html.count('Voir le profil'),
+                'ok': response.status_code == 200 and statements <= budget,
+            })
+            if path == '/browse':
+                match = re.search(r'/browse\?after=([^"&]+)', html)
+                cursor = match and match.group(1)
+    finally:
+        app.debug = debug
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=300)
+    args = parser.parse_args()
+
+    results = measure(args.users)
+    for r in results:
+        print(f'{"ok " if r["ok"] else "KO "} {r["method"]} {r["path"]}: {r["statements"]} requêtes '
+              f'(plafond {r["budget"]}), {r["cards"]} cartes, HTTP {r["status"]}')
+    sys.exit(0 if all(r['ok'] for r in results) else 1)
+
+
+if __name__ == '__main__':
+    main()
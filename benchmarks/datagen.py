@@ -0,0 +1,319 @@
+"""Générateur déterministe de données synthétiques pour les benchmarks.
+
+Remplit une base vide avec les tables des vrais modèles (User, Profile,
+Interest, Like, Match, Block, Message, Notification) en respectant les
+distributions observées en production : population regroupée autour de
+quelques villes, likes en loi de puissance (quelques profils très
+populaires, beaucoup d'utilisateurs qui likent peu), une part de likes
+réciproques qui donnent des matchs, et des conversations à longue traîne
+dont certaines de plusieurs milliers de messages.
+
+Les insertions passent par le Core SQLAlchemy, par lots, sans les
+événements ORM : les colonnes dérivées (geo_cell, matchs, compteur de
+notifications non lues, index plein texte) sont recalculées ensuite avec
+les mêmes fonctions que l'application. Même graine, même base.
+
+Par défaut, la base est un fichier SQLite temporaire, même si DATABASE_URL
+est exportée (ce serait la vraie base de l'application). Une autre base se
+donne avec --database-url : ses tables sont créées si besoin et elle doit
+être vide, sauf avec --reset qui les supprime d'abord.
+
+    python benchmarks/datagen.py --users 10000
+    python benchmarks/datagen.py --database-url postgresql://localhost/onlyz_bench --users 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+import fulltext  # noqa: E402
+import geo  # noqa: E402
+from models import (db, User, Profile, Interest, Like, Match, Block, Message, Notification,  # noqa: E402
+                    profile_interests)
+
+PASSWORD = 'benchmark'
+EPOCH = datetime(2025, 1, 1)
+
+CITIES = [
+    ('Paris', 'France', 48.85, 2.35, 0.30),
+    ('Lyon', 'France', 45.76, 4.84, 0.12),
+    ('Marseille', 'France', 43.30, 5.37, 0.10),
+    ('Bruxelles', 'Belgique', 50.85, 4.35, 0.10),
+    ('Kinshasa', 'RDC', -4.32, 15.31, 0.20),
+    ('Abidjan', "Côte d'Ivoire", 5.36, -4.01, 0.10),
+    ('Montréal', 'Canada', 45.50, -73.57, 0.08),
+]
+
+INTERESTS = [
+    'musique', 'voyage', 'cuisine', 'cinéma', 'sport', 'lecture', 'randonnée', 'photographie',
+    'danse', 'jeux vidéo', 'art', 'théâtre', 'yoga', 'football', 'basket', 'natation',
+    'vélo', 'mode', 'jardinage', 'animaux', 'technologie', 'histoire', 'sciences', 'langues',
+    'bénévolat', 'vin', 'café', 'séries', 'concerts', 'escalade', 'ski', 'plage',
+    'montagne', 'méditation', 'peinture', 'écriture', 'podcasts', 'astronomie', 'échecs', 'brunch',
+]
+
+BIO_WORDS = [
+    'aime', 'passionné', 'curieuse', 'sorties', 'week-end', 'nature', 'rires', 'bonne', 'humeur',
+    'découvrir', 'nouveaux', 'restaurants', 'soirées', 'calmes', 'aventure', 'sincère', 'famille',
+    'amis', 'projets', 'sourire', 'spontané', 'discussions', 'longues', 'balades', 'voyages',
+] + INTERESTS
+
+
+def insert(table, rows, batch):
+    for start in range(0, len(rows), batch):
+        db.session.execute(table.insert(), rows[start:start + batch])
+
+
+def heavy_tail(rng, n, exponent, cap):
+    return np.minimum(rng.zipf(exponent, n), cap)
+
+
+def generate(n_users, seed=42, batch=5000, reciprocity=0.15, chat_share=0.3, log=print):
+    """Remplit une base vide et retourne le volume de chaque table."""
+    rng = np.random.default_rng(seed)
+    started = time.perf_counter()
+
+    def step(label):
+        db.session.commit()
+        log(f'  {label} ({time.perf_counter() - started:.1f}s)')
+
+    if db.session.query(User.id).first() is not None:
+        raise RuntimeError('La base doit être vide')
+
+    # Utilisateurs : identifiants 1..n attribués dans l'ordre d'insertion.
+    password_hash = generate_password_hash(PASSWORD)
+    signup = np.sort(rng.integers(0, 365 * 24 * 3600, n_users))
+    users = [{
+        'username': f'user{i}',
+        'email': f'user{i}@example.com',
+        'password_hash': password_hash,
+        'accepted_terms': True,
+        'created_at': EPOCH + timedelta(seconds=int(signup[i - 1])),
+        'last_seen': EPOCH + timedelta(seconds=int(signup[i - 1])),
+    } for i in range(1, n_users + 1)]
+    insert(User.__table__, users, batch)
+    del users
+    first_id, last_id = db.session.query(db.func.min(User.id), db.func.max(User.id)).one()
+    if (first_id, last_id) != (1, n_users):
+        raise RuntimeError('Identifiants utilisateurs inattendus : la base doit être neuve')
+    step(f'{n_users} utilisateurs')
+
+    # Profils : géographie regroupée par ville, 10 % sans coordonnées.
+    weights = np.array([c[4] for c in CITIES])
+    city = rng.choice(len(CITIES), n_users, p=weights / weights.sum())
+    latitude = np.array([c[2] for c in CITIES])[city] + rng.normal(0, 0.15, n_users)
+    longitude = np.array([c[3] for c in CITIES])[city] + rng.normal(0, 0.15, n_users)
+    located = rng.random(n_users) >= 0.1
+    gender = rng.choice(['homme', 'femme'], n_users)
+    looking_for = np.where(rng.random(n_users) < 0.85, np.where(gender == 'homme', 'femme', 'homme'), 'tous')
+    birth = rng.integers(18 * 365, 60 * 365, n_users)
+    bio_lengths = rng.integers(0, 25, n_users)
+    profiles = []
+    for i in range(n_users):
+        lat, lon = (float(latitude[i]), float(longitude[i])) if located[i] else (None, None)
+        profiles.append({
+            'user_id': i + 1,
+            'first_name': f'Prénom{i + 1}',
+            'date_of_birth': (EPOCH - timedelta(days=int(birth[i]))).date(),
+            'gender': gender[i],
+            'looking_for': looking_for[i],
+            'bio': ' '.join(rng.choice(BIO_WORDS, bio_lengths[i])) or None,
+            'city': CITIES[city[i]][0],
+            'country': CITIES[city[i]][1],
+            'latitude': lat,
+            'longitude': lon,
+            'geo_cell': geo.cell_id(lat, lon),
+        })
+    insert(Profile.__table__, profiles, batch)
+    del profiles
+    step('profils')
+
+    # Centres d'intérêt : popularité en loi de Zipf, 2 à 6 par profil.
+    insert(Interest.__table__, [{'name': name} for name in INTERESTS], batch)
+    popularity = 1 / np.arange(1, len(INTERESTS) + 1)
+    popularity /= popularity.sum()
+    counts = rng.integers(2, 7, n_users)
+    links = []
+    for i in range(n_users):
+        for interest in rng.choice(len(INTERESTS), counts[i], replace=False, p=popularity):
+            links.append({'profile_id': i + 1, 'interest_id': int(interest) + 1})
+    insert(profile_interests, links, batch)
+    del links
+    step("centres d'intérêt")
+
+    # Likes : nombre de likes donnés et attractivité en loi de puissance.
+    given = heavy_tail(rng, n_users, 1.8, 500)
+    likers = np.repeat(np.arange(1, n_users + 1), given)
+    attractiveness = rng.pareto(1.2, n_users) + 1
+    liked = rng.choice(n_users, len(likers), p=attractiveness / attractiveness.sum()) + 1
+    reciprocal = rng.random(len(likers)) < reciprocity
+    likers, liked = np.concatenate([likers, liked[reciprocal]]), np.concatenate([liked, likers[reciprocal]])
+    keep = likers != liked
+    pairs = np.unique(likers[keep].astype(np.int64) * (n_users + 1) + liked[keep])
+    likers, liked = pairs // (n_users + 1), pairs % (n_users + 1)
+    like_at = signup[np.maximum(likers, liked) - 1] + rng.integers(0, 30 * 24 * 3600, len(pairs))
+    insert(Like.__table__, [{
+        'liker_id': int(a), 'liked_id': int(b), 'created_at': EPOCH + timedelta(seconds=int(t))
+    } for a, b, t in zip(likers, liked, like_at)], batch)
+    step(f'{len(pairs)} likes')
+
+    n_matches = Match.backfill_from_likes()
+    step(f'{n_matches} matchs')
+
+    # Blocages : 1 % des utilisateurs en bloquent un à trois autres.
+    blockers = rng.choice(n_users, max(1, n_users // 100), replace=False) + 1
+    blocks = {
+        (int(blocker), int(blocked))
+        for blocker in blockers
+        for blocked in rng.integers(1, n_users + 1, rng.integers(1, 4))
+        if blocked != blocker
+    }
+    insert(Block.__table__, [{'blocker_id': a, 'blocked_id': b, 'created_at': EPOCH} for a, b in sorted(blocks)], batch)
+    step(f'{len(blocks)} blocages')
+
+    # Conversations : une partie des matchs discute, longueur à longue traîne.
+    # Le premier match retenu porte toujours une longue conversation.
+    matches = db.session.execute(
+        db.select(Match.user_a_id, Match.user_b_id, Match.created_at).order_by(Match.id)
+    ).all()
+    chatting = [m for m in matches if rng.random() < chat_share]
+    lengths = heavy_tail(rng, len(chatting), 1.6, 5000)
+    if len(lengths):
+        lengths[0] = 2000
+    n_messages = 0
+    rows = []
+    for (user_a, user_b, matched_at), length in zip(chatting, lengths):
+        gaps = np.cumsum(rng.integers(5, 3600, length))
+        senders = np.where(rng.random(length) < 0.5, user_a, user_b)
+        for k in range(length):
+            sender = int(senders[k])
+            rows.append({
+                'sender_id': sender,
+                'receiver_id': user_b if sender == user_a else user_a,
+                'content': ' '.join(rng.choice(BIO_WORDS, rng.integers(1, 12))),
+                'created_at': matched_at + timedelta(seconds=int(gaps[k])),
+                'is_read': k < length - 3,
+            })
+        if len(rows) >= batch:
+            insert(Message.__table__, rows, batch)
+            n_messages += len(rows)
+            rows = []
+    insert(Message.__table__, rows, batch)
+    n_messages += len(rows)
+    step(f'{n_messages} messages')
+
+    # Notifications de match, les plus récentes non lues.
+    notifications = []
+    for user_a, user_b, matched_at in matches:
+        for user_id, other in ((user_a, user_b), (user_b, user_a)):
+            notifications.append({
+                'user_id': user_id,
+                'type': 'match',
+                'content': f'Vous avez un nouveau match avec user{other} !',
+                'related_user_id': other,
+                'is_read': rng.random() < 0.8,
+                'created_at': matched_at,
+            })
+    insert(Notification.__table__, notifications, batch)
+    unread = db.session.execute(
+        db.select(Notification.user_id, db.func.count()).where(Notification.is_read.is_(False))
+        .group_by(Notification.user_id)
+    ).all()
+    table = User.__table__
+    statement = db.update(table).where(table.c.id == db.bindparam('b_id')).values(
+        unread_notifications=db.bindparam('b_unread')
+    )
+    for start in range(0, len(unread), batch):
+        db.session.execute(statement, [{'b_id': u, 'b_unread': n} for u, n in unread[start:start + batch]])
+    step(f'{len(notifications)} notifications')
+
+    fulltext.refresh()
+    step('index plein texte')
+
+    return {
+        'users': n_users,
+        'likes': len(pairs),
+        'matches': n_matches,
+        'blocks': len(blocks),
+        'messages': n_messages,
+        'notifications': len(notifications),
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+
+
+def probe_users(limit=20):
+    """Utilisateurs témoins : les plus matchés, avec le partenaire de leur plus longue conversation.
+
+    Ce sont eux qui remplissent le plus les pages de matchs, de chat et de notifications.
+    """
+    sides = db.union_all(
+        db.select(Match.user_a_id.label('user_id')),
+        db.select(Match.user_b_id.label('user_id')),
+    ).subquery()
+    user_ids = db.session.scalars(
+        db.select(sides.c.user_id).group_by(sides.c.user_id)
+        .order_by(db.func.count().desc(), sides.c.user_id).limit(limit)
+    ).all()
+    probes = []
+    for user_id in user_ids:
+        partner = db.session.execute(
+            db.select(Message.receiver_id, db.func.count()).where(Message.sender_id == user_id)
+            .group_by(Message.receiver_id).order_by(db.func.count().desc()).limit(1)
+        ).first()
+        if partner is None:
+            match = Match.query.filter(db.or_(Match.user_a_id == user_id, Match.user_b_id == user_id)).first()
+            partner = (match.user_b_id if match.user_a_id == user_id else match.user_a_id,)
+        probes.append({'user_id': user_id, 'partner_id': partner[0]})
+    return probes
+
+
+def database_url(url, name):
+    """Base des benchmarks : url si elle est donnée, sinon un fichier SQLite temporaire.
+
+    DATABASE_URL n'est pas lue : exportée pour l'application, elle désignerait la vraie base.
+    """
+    return url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), f'{name}.db')
+
+
+def add_database_arguments(parser):
+    parser.add_argument('--database-url', help='base à remplir (par défaut : SQLite temporaire)')
+    parser.add_argument('--reset', action='store_true',
+                        help='supprimer les tables de --database-url avant de les recréer')
+
+
+def prepare(reset=False):
+    """Crée les tables ; ne les supprime qu'avec reset (une base temporaire est déjà vide)."""
+    if reset:
+        db.drop_all()
+    db.create_all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--batch', type=int, default=5000)
+    add_database_arguments(parser)
+    args = parser.parse_args()
+    if args.reset and not args.database_url:
+        parser.error('--reset exige --database-url')
+
+    # Fixée avant le premier import de app, qui lit DATABASE_URL.
+    os.environ['DATABASE_URL'] = database_url(args.database_url, 'datagen')
+    from app import app
+    with app.app_context():
+        prepare(args.reset)
+        print(f"Génération sur {db.engine.url.render_as_string(hide_password=True)}")
+        print(generate(args.users, seed=args.seed, batch=args.batch))
+
+
+if __name__ == '__main__':
+    main()
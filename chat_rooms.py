@@ -0,0 +1,68 @@
+import threading
+from collections import namedtuple
+
+
+# Ce dont handle_message a besoin sur le destinataire, figé au join.
+ChatPeer = namedtuple('ChatPeer', 'id username email')
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def room_name(user_id, other_id):
+    return f'chat_{min(user_id, other_id)}_{max(user_id, other_id)}'
+
+
+def parse_room(room, user_id):
+    """Retourne l'autre participant d'un salon chat_<a>_<b>, ou None si user_id n'en fait pas partie."""
+    try:
+        prefix, user_a_id, user_b_id = room.split('_')
+        user_a_id, user_b_id = int(user_a_id), int(user_b_id)
+    except (AttributeError, ValueError):
+        return None
+    if prefix != 'chat' or user_a_id >= user_b_id or user_id not in (user_a_id, user_b_id):
+        return None
+    return user_b_id if user_id == user_a_id else user_a_id
+
+
+def authorize(sid, user_id, peer):
+    with _lock:
+        session = _sessions.setdefault(sid, {'user_id': user_id, 'peers': {}})
+        session['peers'][peer.id] = peer
+
+
+def peer_for(sid, user_id, other_id):
+    session = _sessions.get(sid)
+    if session is None or session['user_id'] != user_id:
+        return None
+    return session['peers'].get(other_id)
+
+
+def leave(sid, other_id):
+    with _lock:
+        session = _sessions.get(sid)
+        if session:
+            session['peers'].pop(other_id, None)
+
+
+def forget(sid):
+    with _lock:
+        _sessions.pop(sid, None)
+
+
+def revoke(user_id, other_id):
+    """Retire l'autorisation des deux côtés, pour toutes les connexions de ce processus."""
+    with _lock:
+        for session in _sessions.values():
+            if session['user_id'] == user_id:
+                session['peers'].pop(other_id, None)
+            elif session['user_id'] == other_id:
+                session['peers'].pop(user_id, None)
+
+
+def stats():
+    with _lock:
+        return {
+            'sessions': len(_sessions),
+            'rooms': sum(len(s['peers']) for s in _sessions.values())
+        }
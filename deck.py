@@ -0,0 +1,167 @@
+import queue
+import struct
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+
+import exclusions
+from models import db, User, Profile, SwipeDeck
+
+
+_lock = threading.Lock()
+stats = {'pops': 0, 'skipped': 0, 'consumed': 0, 'built': 0, 'sync_builds': 0, 'refills_queued': 0, 'evicted': 0}
+
+# Paquets à recompléter, traités par la boucle de fond ; _queued évite les doublons.
+jobs = queue.Queue()
+_queued = set()
+
+
+def _count(key, n=1):
+    with _lock:
+        stats[key] += n
+
+
+def get_stats():
+    with _lock:
+        snapshot = dict(stats)
+    snapshot['decks'] = SwipeDeck.query.count()
+    snapshot['queued'] = jobs.qsize()
+    return snapshot
+
+
+def _pack(ids):
+    return np.asarray(ids, dtype='<i4').tobytes()
+
+
+def _unpack(blob):
+    return np.frombuffer(blob, dtype='<i4')
+
+
+def _at(entry, index):
+    return struct.unpack_from('<i', entry.candidate_ids, 4 * index)[0]
+
+
+def enqueue(user_id):
+    with _lock:
+        if user_id in _queued:
+            return
+        _queued.add(user_id)
+    jobs.put(user_id)
+    _count('refills_queued')
+
+
+def _check_low_water(entry):
+    # position > 0 : un petit paquet tout juste construit n'est pas reconstruit en boucle.
+    if entry.position and entry.remaining < current_app.config['DECK_LOW_WATER']:
+        enqueue(entry.user_id)
+
+
+def build(user, rank):
+    """(Re)construit le paquet : la fin non lue d'abord, puis les nouveaux candidats classés.
+
+    Les candidats déjà présentés ne reviennent pas au premier recomplètement.
+    """
+    size = current_app.config['DECK_SIZE']
+    entry = db.session.get(SwipeDeck, user.id, with_for_update=True) or SwipeDeck(user_id=user.id)
+    old = _unpack(entry.candidate_ids or b'')
+    unread = [int(i) for i in old[entry.position or 0:] if not exclusions.is_excluded(user.id, int(i))]
+    known = set(old.tolist())
+    fresh = [i for i in rank(user, limit=size + len(known)) if i not in known]
+    ids = (unread + fresh)[:size]
+
+    entry.candidate_ids = _pack(ids)
+    entry.size = len(ids)
+    entry.position = 0
+    entry.built_at = datetime.utcnow()
+    db.session.add(entry)
+    _count('built')
+    return entry
+
+
+def pop(user, rank):
+    """Candidat suivant du paquet, ou None s'il n'y en a plus.
+
+    Les candidats likés ou bloqués depuis la construction sont sautés ici
+    plutôt que retirés du paquet à chaque action.
+    """
+    entry = db.session.get(SwipeDeck, user.id, with_for_update=True)
+    if entry is None or not entry.remaining:
+        entry = build(user, rank)
+        _count('sync_builds')
+
+    candidate_id = None
+    while entry.position < entry.size:
+        next_id = _at(entry, entry.position)
+        entry.position += 1
+        # Le cache écarte vite la plupart des exclus ; le candidat retenu est revérifié en base,
+        # sinon liker depuis le deck un profil déjà liké annulerait ce like.
+        if not exclusions.is_excluded(user.id, next_id) and not exclusions.is_blocked_or_liked(user.id, next_id):
+            candidate_id = next_id
+            break
+        _count('skipped')
+    _count('pops')
+    _check_low_water(entry)
+    return candidate_id, entry.remaining
+
+
+def consume(user_id, candidate_id):
+    """Retire le candidat s'il est en tête du paquet (like ou blocage sans passer par /deck/next).
+
+    Ailleurs dans le paquet, il sera sauté au dépilement.
+    """
+    entry = db.session.get(SwipeDeck, user_id)
+    if entry is None:
+        return
+    if entry.position < entry.size and _at(entry, entry.position) == candidate_id:
+        entry.position += 1
+        _count('consumed')
+        _check_low_water(entry)
+
+
+def refill_pending(rank):
+    """Recomplète les paquets signalés sous le seuil bas ; renvoie le nombre traité."""
+    done = 0
+    while True:
+        try:
+            user_id = jobs.get_nowait()
+        except queue.Empty:
+            return done
+        with _lock:
+            _queued.discard(user_id)
+        user = User.query.join(Profile).filter(User.id == user_id).first()
+        if user is not None:
+            build(user, rank)
+            db.session.commit()
+            done += 1
+
+
+def build_batch(rank, batch_size=None):
+    """Construit les paquets manquants, périmés ou presque vides des utilisateurs actifs."""
+    config = current_app.config
+    batch_size = batch_size or config['DECK_BUILD_BATCH']
+    now = datetime.utcnow()
+
+    inactive = db.select(User.id).where(
+        User.last_seen < now - timedelta(days=config['RECOMMENDATION_CACHE_EVICT_DAYS'])
+    )
+    evicted = SwipeDeck.query.filter(SwipeDeck.user_id.in_(inactive)).delete(synchronize_session=False)
+    _count('evicted', evicted)
+
+    stale_before = now - timedelta(seconds=config['DECK_TTL'])
+    users = User.query.join(Profile).outerjoin(
+        SwipeDeck, SwipeDeck.user_id == User.id
+    ).filter(
+        User.last_seen >= now - timedelta(days=config['RECOMMENDATION_ACTIVE_DAYS']),
+        db.or_(
+            SwipeDeck.user_id.is_(None),
+            SwipeDeck.built_at < stale_before,
+            db.and_(SwipeDeck.position > 0, SwipeDeck.size - SwipeDeck.position < config['DECK_LOW_WATER'])
+        )
+    ).order_by(User.last_seen.desc()).limit(batch_size).all()
+
+    for user in users:
+        build(user, rank)
+    db.session.commit()
+    return len(users)
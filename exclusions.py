@@ -0,0 +1,86 @@
+import numpy as np
+
+from cache import LRUCache
+from models import db, User, Like, Block
+
+
+# Ensembles compacts (tableaux int32 triés) par utilisateur, pour filtrer des
+# identifiants déjà en mémoire : le paquet de deck.py. Browse, la recherche et
+# les recommandations filtrent dans la requête avec exclusion_clause() : y
+# renvoyer ces ensembles recréerait de longues listes NOT IN, et leurs
+# résultats doivent être exacts. Le TTL borne la durée pendant laquelle un
+# autre processus peut servir un ensemble périmé : les autorisations passent
+# par la base.
+_cache = LRUCache('exclusions', maxsize=10000, ttl=60)
+
+
+def init_app(app):
+    _cache.maxsize = app.config['EXCLUSION_CACHE_SIZE']
+    _cache.ttl = app.config['EXCLUSION_CACHE_TTL']
+
+
+def exclusion_clause(user_id, include_likes=False):
+    conditions = [
+        User.id != user_id,
+        ~db.select(Block.id).where(Block.blocker_id == user_id, Block.blocked_id == User.id).exists(),
+        ~db.select(Block.id).where(Block.blocked_id == user_id, Block.blocker_id == User.id).exists(),
+    ]
+    if include_likes:
+        conditions.append(
+            ~db.select(Like.id).where(Like.liker_id == user_id, Like.liked_id == User.id).exists()
+        )
+    return db.and_(*conditions)
+
+
+def _load(user_id):
+    blocked = db.union(
+        db.select(Block.blocked_id).where(Block.blocker_id == user_id),
+        db.select(Block.blocker_id).where(Block.blocked_id == user_id),
+    )
+    liked = db.select(Like.liked_id).where(Like.liker_id == user_id)
+    return (
+        np.unique(np.fromiter(db.session.scalars(blocked), dtype=np.int32)),
+        np.unique(np.fromiter(db.session.scalars(liked), dtype=np.int32)),
+    )
+
+
+def _sets(user_id):
+    sets = _cache.get(user_id)
+    if sets is None:
+        sets = _load(user_id)
+        _cache.set(user_id, sets)
+    return sets
+
+
+def _contains(sorted_ids, value):
+    i = np.searchsorted(sorted_ids, value)
+    return i < len(sorted_ids) and sorted_ids[i] == value
+
+
+def is_blocked_between(user_id, other_id):
+    # Lu en base : un blocage fait sur un autre worker n'y a pas encore vidé le cache.
+    return db.session.query(db.select(Block.id).where(db.or_(
+        db.and_(Block.blocker_id == user_id, Block.blocked_id == other_id),
+        db.and_(Block.blocker_id == other_id, Block.blocked_id == user_id),
+    )).exists()).scalar()
+
+
+def is_blocked_or_liked(user_id, other_id):
+    # Lu en base comme is_blocked_between : un like fait sur un autre worker, ou depuis
+    # moins d'EXCLUSION_CACHE_TTL secondes, n'est pas encore dans le cache.
+    blocked = db.select(Block.id).where(db.or_(
+        db.and_(Block.blocker_id == user_id, Block.blocked_id == other_id),
+        db.and_(Block.blocker_id == other_id, Block.blocked_id == user_id),
+    )).exists()
+    liked = db.select(Like.id).where(Like.liker_id == user_id, Like.liked_id == other_id).exists()
+    return db.session.query(db.or_(blocked, liked)).scalar()
+
+
+def is_excluded(user_id, other_id):
+    # Bloqué dans un sens ou l'autre, ou déjà liké, d'après le cache : pour filtrer.
+    blocked, liked = _sets(user_id)
+    return other_id == user_id or _contains(blocked, other_id) or _contains(liked, other_id)
+
+
+def invalidate(*user_ids):
+    _cache.delete(*user_ids)
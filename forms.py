@@ -91,7 +91,7 @@ class SearchForm(FlaskForm):
         ('autre', 'Autre')
     ])
     max_distance = IntegerField('Distance maximum (km)', validators=[Optional()], default=100)
-    keywords = StringField('Mots-clés dans la bio', validators=[Length(max=100)])
+    keywords = StringField('Mots-clés (bio, centres d\'intérêt)', validators=[Length(max=100)])
 
 
 class MessageForm(FlaskForm):
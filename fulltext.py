@@ -0,0 +1,122 @@
+import re
+
+import sqlalchemy as sa
+
+from models import db, Profile
+
+
+# Postgres : colonne tsvector (bio en poids A, centres d'intérêt en B) sur
+# profile, indexée en GIN. SQLite : table FTS5 profile_fts dont le rowid est
+# l'id du profil. Les deux sont tenues à jour par refresh().
+FTS_CONFIG = 'french'
+
+search_vector = sa.literal_column('profile.search_vector')
+
+_interest_names = {
+    'postgresql': """
+        SELECT string_agg(interest.name, ' ') FROM interest
+        JOIN profile_interests ON profile_interests.interest_id = interest.id
+        WHERE profile_interests.profile_id = profile.id
+    """,
+    'sqlite': """
+        SELECT group_concat(interest.name, ' ') FROM interest
+        JOIN profile_interests ON profile_interests.interest_id = interest.id
+        WHERE profile_interests.profile_id = profile.id
+    """,
+}
+
+
+def dialect(bind=None):
+    return (bind or db.session.get_bind()).dialect.name
+
+
+def create_index(target, connection, **kw):
+    if connection.dialect.name == 'postgresql':
+        connection.execute(sa.text('ALTER TABLE profile ADD COLUMN IF NOT EXISTS search_vector tsvector'))
+        connection.execute(sa.text(
+            'CREATE INDEX IF NOT EXISTS ix_profile_search_vector ON profile USING gin (search_vector)'
+        ))
+    elif connection.dialect.name == 'sqlite':
+        connection.execute(sa.text(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS profile_fts USING fts5("
+            "bio, interests, tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+
+
+def drop_index(target, connection, **kw):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(sa.text('DROP TABLE IF EXISTS profile_fts'))
+
+
+sa.event.listen(Profile.__table__, 'after_create', create_index)
+sa.event.listen(Profile.__table__, 'before_drop', drop_index)
+
+
+def refresh(profile_ids=None, connection=None):
+    """Recalcule l'index des profils donnés (tous si None), dans la transaction courante."""
+    executor = connection or db.session
+    name = dialect(connection)
+    where, params = '', {}
+    if profile_ids is not None:
+        if not profile_ids:
+            return
+        where = 'WHERE profile.id IN :ids'
+        params = {'ids': list(profile_ids)}
+
+    if name == 'postgresql':
+        statement = sa.text(f"""
+            UPDATE profile SET search_vector =
+                setweight(to_tsvector('{FTS_CONFIG}', coalesce(profile.bio, '')), 'A') ||
+                setweight(to_tsvector('{FTS_CONFIG}', coalesce(({_interest_names[name]}), '')), 'B')
+            {where}
+        """)
+    elif name == 'sqlite':
+        fts_where = 'WHERE rowid IN :ids' if profile_ids is not None else ''
+        delete = sa.text(f'DELETE FROM profile_fts {fts_where}')
+        if profile_ids is not None:
+            delete = delete.bindparams(sa.bindparam('ids', expanding=True))
+        executor.execute(delete, params)
+        statement = sa.text(f"""
+            INSERT INTO profile_fts (rowid, bio, interests)
+            SELECT profile.id, coalesce(profile.bio, ''), coalesce(({_interest_names[name]}), '')
+            FROM profile {where}
+        """)
+    else:
+        return
+
+    if profile_ids is not None:
+        statement = statement.bindparams(sa.bindparam('ids', expanding=True))
+    executor.execute(statement, params)
+
+
+def fts5_query(keywords):
+    # Chaque mot devient un préfixe entre guillemets : pas de syntaxe FTS5 venant de l'utilisateur.
+    terms = re.findall(r'\w+', keywords)
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching(query, keywords):
+    """Restreint une requête sur Profile aux profils correspondant aux mots-clés.
+
+    Retourne la requête et une expression de pertinence (plus grand = meilleur).
+    """
+    name = dialect()
+    if name == 'postgresql':
+        tsquery = sa.func.websearch_to_tsquery(FTS_CONFIG, keywords)
+        # ts_rank_cd est un float4 : comparé au curseur (un double Python), il ne serait jamais
+        # égal et les profils à égalité en fin de page seraient sautés. Converti une fois en double.
+        relevance = sa.cast(sa.func.ts_rank_cd(search_vector, tsquery), sa.Float)
+        return query.filter(search_vector.op('@@')(tsquery)), relevance
+
+    if name == 'sqlite':
+        terms = fts5_query(keywords)
+        if not terms:
+            return query, sa.literal(0)
+        hits = sa.text(
+            'SELECT rowid AS profile_id, bm25(profile_fts, 2.0, 1.0) AS score '
+            'FROM profile_fts WHERE profile_fts MATCH :terms'
+        ).bindparams(terms=terms).columns(profile_id=sa.Integer, score=sa.Float).subquery('fts_hits')
+        # bm25 est négatif, d'autant plus que le profil est pertinent.
+        return query.join(hits, hits.c.profile_id == Profile.id), -hits.c.score
+
+    return query.filter(Profile.bio.ilike(f'%{keywords}%')), sa.literal(0)
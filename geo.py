@@ -0,0 +1,59 @@
+import math
+
+
+CELL_SIZE_DEG = 0.5
+CELL_COLUMNS = int(360 / CELL_SIZE_DEG)
+CELL_ROWS = int(180 / CELL_SIZE_DEG)
+MAX_CELLS = 256
+
+# Bornes basses de la longueur d'un degré sur l'ellipsoïde WGS-84 : la boîte
+# englobante est toujours un peu plus grande que le cercle de recherche.
+KM_PER_DEG_LAT = 110.0
+KM_PER_DEG_LON_EQUATOR = 111.0
+
+
+def cell_row(latitude):
+    return min(CELL_ROWS - 1, max(0, int(math.floor((latitude + 90) / CELL_SIZE_DEG))))
+
+
+def cell_column(longitude):
+    return int(math.floor((longitude + 180) / CELL_SIZE_DEG)) % CELL_COLUMNS
+
+
+def cell_id(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return cell_row(latitude) * CELL_COLUMNS + cell_column(longitude)
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """Renvoie (lat_min, lat_max, plages_de_longitude) ; plages vide = toutes."""
+    dlat = radius_km / KM_PER_DEG_LAT
+    lat_min, lat_max = max(-90.0, latitude - dlat), min(90.0, latitude + dlat)
+
+    widest = max(abs(lat_min), abs(lat_max))
+    if widest >= 89.9:
+        return lat_min, lat_max, []
+    dlon = radius_km / (KM_PER_DEG_LON_EQUATOR * math.cos(math.radians(widest)))
+    if dlon >= 180:
+        return lat_min, lat_max, []
+
+    lon_min, lon_max = longitude - dlon, longitude + dlon
+    if lon_min < -180:
+        return lat_min, lat_max, [(lon_min + 360, 180.0), (-180.0, lon_max)]
+    if lon_max > 180:
+        return lat_min, lat_max, [(lon_min, 180.0), (-180.0, lon_max - 360)]
+    return lat_min, lat_max, [(lon_min, lon_max)]
+
+
+def cells_in_box(lat_min, lat_max, lon_ranges):
+    rows = range(cell_row(lat_min), cell_row(lat_max) + 1)
+    if lon_ranges:
+        columns = set()
+        for lon_min, lon_max in lon_ranges:
+            columns.update(range(cell_column(lon_min), cell_column(min(lon_max, 179.999999)) + 1))
+    else:
+        columns = range(CELL_COLUMNS)
+    if len(rows) * len(columns) > MAX_CELLS:
+        return None
+    return sorted(row * CELL_COLUMNS + column for row in rows for column in columns)
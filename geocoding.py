@@ -0,0 +1,115 @@
+import csv
+import queue
+import re
+import unicodedata
+
+from flask import current_app
+from geopy.extra.rate_limiter import RateLimiter
+from geopy.geocoders import Nominatim
+
+from models import db, Profile, GeocodeCache
+
+
+GAZETTEER_PATH = 'data/gazetteer.csv'
+
+jobs = queue.Queue()
+_geocode = None
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return re.sub(r'[\s\-_\'’.,]+', ' ', text).strip().casefold()
+
+
+def place_key(city, country):
+    return normalize(city), normalize(country)
+
+
+def same_place(city_a, country_a, city_b, country_b):
+    return place_key(city_a, country_a) == place_key(city_b, country_b)
+
+
+def lookup(city, country):
+    city_key, country_key = place_key(city, country)
+    return GeocodeCache.query.filter_by(city_key=city_key, country_key=country_key).first()
+
+
+def store(city, country, latitude, longitude, source):
+    entry = lookup(city, country)
+    if entry is None:
+        city_key, country_key = place_key(city, country)
+        entry = GeocodeCache(city_key=city_key, country_key=country_key)
+        db.session.add(entry)
+    entry.latitude = latitude
+    entry.longitude = longitude
+    entry.source = source
+    return entry
+
+
+def locate(profile):
+    """Renseigne les coordonnées depuis le cache ; False si un géocodage reste à faire."""
+    entry = lookup(profile.city, profile.country)
+    if entry is None:
+        return False
+    if entry.found:
+        profile.latitude = entry.latitude
+        profile.longitude = entry.longitude
+    return True
+
+
+def enqueue(profile_id):
+    jobs.put(profile_id)
+
+
+def seed_from_gazetteer(path=GAZETTEER_PATH):
+    count = 0
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            store(row['city'], row['country'], float(row['latitude']), float(row['longitude']), 'gazetteer')
+            count += 1
+    db.session.commit()
+    return count
+
+
+def _geocoder():
+    global _geocode
+    if _geocode is None:
+        # Politique d'usage de Nominatim : une requête par seconde au plus.
+        geolocator = Nominatim(user_agent='onlyz_app', timeout=10)
+        _geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1)
+    return _geocode
+
+
+def resolve_profile(profile_id):
+    profile = db.session.get(Profile, profile_id)
+    if profile is None or not (profile.city and profile.country):
+        return False
+
+    entry = lookup(profile.city, profile.country)
+    if entry is None:
+        try:
+            location = _geocoder()(f'{profile.city}, {profile.country}')
+        except Exception:
+            current_app.logger.warning('Géocodage impossible pour %s, %s', profile.city, profile.country,
+                                       exc_info=True)
+            return False
+        entry = store(profile.city, profile.country,
+                      location.latitude if location else None,
+                      location.longitude if location else None,
+                      'nominatim')
+
+    if entry.found:
+        profile.latitude = entry.latitude
+        profile.longitude = entry.longitude
+    return entry.found
+
+
+def pending_profile_ids(limit):
+    return db.session.scalars(
+        db.select(Profile.id).where(
+            Profile.city.isnot(None), Profile.city != '',
+            Profile.country.isnot(None), Profile.country != '',
+            Profile.latitude.is_(None)
+        ).limit(limit)
+    ).all()
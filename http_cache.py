@@ -0,0 +1,85 @@
+import hashlib
+from datetime import datetime
+
+from flask import make_response, render_template, request, session
+from flask_login import current_user
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+
+from cache import LRUCache
+
+
+# Pages sans contenu propre au visiteur (accueil, mentions légales), pour les visiteurs anonymes.
+_pages = LRUCache('pages', maxsize=32)
+# Cartes de profil des listes, par (profil, variante) ; la version du profil est vérifiée à la lecture.
+_cards = LRUCache('profile_cards', maxsize=5000)
+
+
+def etag_for(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _flashes_pending():
+    # Un message flash doit être rendu (et consommé) : pas de 304 ni de page en cache.
+    return bool(session.get('_flashes'))
+
+
+def not_modified(etag, last_modified=None):
+    """Réponse 304 si le client a déjà cette version, sinon None.
+
+    À appeler avant le rendu : seule la requête qui calcule l'ETag a été faite.
+    """
+    if _flashes_pending() or is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    response = make_response('', 304)
+    return conditional(response, etag, last_modified)
+
+
+def conditional(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Page propre au visiteur : gardée par le navigateur, revalidée à chaque affichage.
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def static_page(template):
+    """Rend une page fixe, servie depuis le cache pour les visiteurs anonymes."""
+    if current_user.is_authenticated or _flashes_pending():
+        return render_template(template)
+
+    html = _pages.get(template)
+    if html is None:
+        html = render_template(template)
+        _pages.set(template, html)
+    response = make_response(html)
+    response.set_etag(etag_for(template, html))
+    response.cache_control.public = True
+    response.cache_control.max_age = 3600
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+
+def profile_version(profile):
+    return profile.updated_at, profile.picture_card, profile.profile_picture
+
+
+def profile_card(user, actions='profile'):
+    """Carte de profil des listes (parcourir, recherche, recommandations, matchs).
+
+    L'âge affiché change à l'anniversaire : la date du jour fait partie de la version.
+    """
+    key = (user.profile.id, actions)
+    version = (profile_version(user.profile), datetime.utcnow().date())
+    entry = _cards.get(key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    html = Markup(render_template('_profile_card.html', user=user, actions=actions))
+    _cards.set(key, (version, html))
+    return html
+
+
+def invalidate_profile(profile_id):
+    _cards.delete((profile_id, 'profile'), (profile_id, 'match'))
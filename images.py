@@ -0,0 +1,81 @@
+import os
+import uuid
+from PIL import Image, ImageOps
+
+from pools import ProcessPool
+
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+MAX_PIXELS = 40_000_000
+# (nom, taille, recadrage carré)
+DERIVATIVES = (
+    ('avatar', (96, 96), True),
+    ('card', (600, 600), False),
+    ('full', (1600, 1600), False),
+)
+
+_pool = None
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def save_upload(file, folder, user_id):
+    """Vérifie l'image et la met en attente hors de static/.
+
+    verify() contrôle la structure du fichier sans décoder les pixels : un
+    fichier corrompu est refusé ici, dans la requête, et non après coup par
+    le pool qui ne peut plus prévenir l'utilisateur.
+    """
+    try:
+        with Image.open(file.stream) as image:
+            image_format = image.format
+            width, height = image.size
+            image.verify()
+    except Exception as e:
+        raise InvalidImage('Fichier image illisible') from e
+    if image_format not in ALLOWED_FORMATS:
+        raise InvalidImage('Format d\'image non pris en charge')
+    if width * height > MAX_PIXELS:
+        raise InvalidImage('Image trop grande')
+
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{user_id}_{uuid.uuid4().hex}')
+    file.stream.seek(0)
+    file.save(path)
+    return path
+
+
+def process_image(source, dest_folder, stem):
+    """Décode une seule fois, applique l'orientation EXIF puis écrit les dérivés sans métadonnées."""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        else:
+            image = image.convert('RGB')
+
+    os.makedirs(dest_folder, exist_ok=True)
+    paths = {}
+    for name, size, square in DERIVATIVES:
+        if square:
+            derivative = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            derivative = image.copy()
+            derivative.thumbnail(size, Image.LANCZOS)
+        base = os.path.join(dest_folder, f'{stem}_{name}')
+        derivative.save(f'{base}.jpg', 'JPEG', quality=85, optimize=True, progressive=True)
+        derivative.save(f'{base}.webp', 'WEBP', quality=80, method=4)
+        paths[name] = f'{stem}_{name}.jpg'
+    return paths
+
+
+def submit(source, dest_folder, stem, max_workers):
+    global _pool
+    if _pool is None:
+        _pool = ProcessPool(max_workers)
+    return _pool.submit(process_image, source, dest_folder, stem)
@@ -0,0 +1,37 @@
+"""Add full-text index on profile bio and interests
+
+Revision ID: 0b5d7e9f2a41
+Revises: f4c8a2d6e913
+Create Date: 2026-10-17 16:20:47.118532
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import fulltext
+
+
+# revision identifiers, used by Alembic.
+revision = '0b5d7e9f2a41'
+down_revision = 'f4c8a2d6e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'profile' not in sa.inspect(bind).get_table_names():
+        return
+
+    # Postgres : colonne tsvector + index GIN ; SQLite : table FTS5.
+    fulltext.create_index(None, bind)
+    fulltext.refresh(connection=bind)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_profile_search_vector')
+        op.execute('ALTER TABLE profile DROP COLUMN IF EXISTS search_vector')
+    else:
+        fulltext.drop_index(None, bind)
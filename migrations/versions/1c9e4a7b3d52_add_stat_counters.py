@@ -0,0 +1,41 @@
+"""Add stat counters and daily snapshots
+
+Revision ID: 1c9e4a7b3d52
+Revises: 0b5d7e9f2a41
+Create Date: 2026-10-17 16:58:12.530964
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c9e4a7b3d52'
+down_revision = '0b5d7e9f2a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Initialiser ensuite les compteurs : flask reconcile-stats
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'stat_counter' not in tables:
+        op.create_table('stat_counter',
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('value', sa.BigInteger(), nullable=False),
+            sa.Column('reconciled_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('name')
+        )
+    if 'stat_snapshot' not in tables:
+        op.create_table('stat_snapshot',
+            sa.Column('day', sa.Date(), nullable=False),
+            sa.Column('name', sa.String(length=50), nullable=False),
+            sa.Column('value', sa.BigInteger(), nullable=False),
+            sa.PrimaryKeyConstraint('day', 'name')
+        )
+
+
+def downgrade():
+    op.drop_table('stat_snapshot')
+    op.drop_table('stat_counter')
@@ -0,0 +1,38 @@
+"""Add recommendation cache
+
+Revision ID: 3f9d1c0b7a52
+Revises: a97cc5441d47
+Create Date: 2026-10-17 10:03:18.551907
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9d1c0b7a52'
+down_revision = 'a97cc5441d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'recommendation_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('recommendation_cache',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('candidate_ids', sa.Text(), nullable=False),
+        sa.Column('computed_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('recommendation_cache', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_recommendation_cache_computed_at'), ['computed_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('recommendation_cache', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_recommendation_cache_computed_at'))
+
+    op.drop_table('recommendation_cache')
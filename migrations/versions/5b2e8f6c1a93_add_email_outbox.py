@@ -0,0 +1,49 @@
+"""Add email outbox
+
+Revision ID: 5b2e8f6c1a93
+Revises: c41e7b9a2d08
+Create Date: 2026-10-17 12:41:37.120558
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e8f6c1a93'
+down_revision = 'c41e7b9a2d08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'email_outbox' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('email_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('recipient', sa.String(length=120), nullable=False),
+        sa.Column('subject', sa.String(length=255), nullable=False),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('digest_key', sa.String(length=64), nullable=True),
+        sa.Column('digest_count', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('send_after', sa.DateTime(), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_email_outbox_digest_key'), ['digest_key'], unique=False)
+        batch_op.create_index('ix_email_outbox_status_send_after', ['status', 'send_after'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('email_outbox', schema=None) as batch_op:
+        batch_op.drop_index('ix_email_outbox_status_send_after')
+        batch_op.drop_index(batch_op.f('ix_email_outbox_digest_key'))
+
+    op.drop_table('email_outbox')
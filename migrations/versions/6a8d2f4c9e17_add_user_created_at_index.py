@@ -0,0 +1,32 @@
+"""Add (created_at, id) index on user
+
+Revision ID: 6a8d2f4c9e17
+Revises: 1c9e4a7b3d52
+Create Date: 2026-10-17 17:42:08.913526
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a8d2f4c9e17'
+down_revision = '1c9e4a7b3d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'user' not in inspector.get_table_names():
+        return
+    if 'ix_user_created_at_id' in {i['name'] for i in inspector.get_indexes('user')}:
+        return
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.create_index('ix_user_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index('ix_user_created_at_id')
@@ -0,0 +1,38 @@
+"""Add geocode cache
+
+Revision ID: 8e0a4d7f3b16
+Revises: 5b2e8f6c1a93
+Create Date: 2026-10-17 13:58:50.447019
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e0a4d7f3b16'
+down_revision = '5b2e8f6c1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remplir ensuite avec : flask seed-geocache
+    if 'geocode_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('geocode_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('city_key', sa.String(length=100), nullable=False),
+        sa.Column('country_key', sa.String(length=100), nullable=False),
+        sa.Column('latitude', sa.Float(), nullable=True),
+        sa.Column('longitude', sa.Float(), nullable=True),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('city_key', 'country_key', name='unique_geocode_place')
+    )
+
+
+def downgrade():
+    op.drop_table('geocode_cache')
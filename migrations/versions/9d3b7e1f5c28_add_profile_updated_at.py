@@ -0,0 +1,38 @@
+"""Add updated_at to profile
+
+Revision ID: 9d3b7e1f5c28
+Revises: 6a8d2f4c9e17
+Create Date: 2026-10-17 19:08:41.527310
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b7e1f5c28'
+down_revision = '6a8d2f4c9e17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'profile' not in inspector.get_table_names():
+        return
+    if 'updated_at' in {c['name'] for c in inspector.get_columns('profile')}:
+        return
+
+    with op.batch_alter_table('profile', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    profile = sa.table('profile', sa.column('updated_at', sa.DateTime))
+    bind.execute(profile.update().values(updated_at=datetime.utcnow()))
+
+
+def downgrade():
+    with op.batch_alter_table('profile', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,59 @@
+"""Add spatial grid cell to profile
+
+Revision ID: a97cc5441d47
+Revises: 
+Create Date: 2026-10-17 09:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import geo
+
+
+# revision identifiers, used by Alembic.
+revision = 'a97cc5441d47'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    # Les tables d'origine sont créées par db.create_all() (/init-db) : sur une
+    # base neuve, create_all produit déjà le schéma final.
+    if 'profile' not in inspector.get_table_names():
+        return
+
+    if 'geo_cell' not in {c['name'] for c in inspector.get_columns('profile')}:
+        with op.batch_alter_table('profile', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('geo_cell', sa.Integer(), nullable=True))
+            batch_op.create_index(batch_op.f('ix_profile_geo_cell'), ['geo_cell'], unique=False)
+            batch_op.create_index('ix_profile_latitude_longitude', ['latitude', 'longitude'], unique=False)
+
+    profile = sa.table('profile',
+        sa.column('id', sa.Integer),
+        sa.column('latitude', sa.Float),
+        sa.column('longitude', sa.Float),
+        sa.column('geo_cell', sa.Integer)
+    )
+    rows = bind.execute(
+        sa.select(profile.c.id, profile.c.latitude, profile.c.longitude)
+        .where(profile.c.latitude.isnot(None), profile.c.longitude.isnot(None))
+    ).all()
+    updates = [{'profile_id': row.id, 'cell': geo.cell_id(row.latitude, row.longitude)} for row in rows]
+    if updates:
+        bind.execute(
+            profile.update()
+            .where(profile.c.id == sa.bindparam('profile_id'))
+            .values(geo_cell=sa.bindparam('cell')),
+            updates
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('profile', schema=None) as batch_op:
+        batch_op.drop_index('ix_profile_latitude_longitude')
+        batch_op.drop_index(batch_op.f('ix_profile_geo_cell'))
+        batch_op.drop_column('geo_cell')
@@ -0,0 +1,40 @@
+"""Add swipe deck
+
+Revision ID: b58e2c7a4d19
+Revises: 9d3b7e1f5c28
+Create Date: 2026-10-17 20:14:52.308417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b58e2c7a4d19'
+down_revision = '9d3b7e1f5c28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'swipe_deck' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('swipe_deck',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('candidate_ids', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('built_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    with op.batch_alter_table('swipe_deck', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_swipe_deck_built_at'), ['built_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('swipe_deck', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_swipe_deck_built_at'))
+
+    op.drop_table('swipe_deck')
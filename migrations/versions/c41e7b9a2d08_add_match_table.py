@@ -0,0 +1,43 @@
+"""Add materialized match table
+
+Revision ID: c41e7b9a2d08
+Revises: 3f9d1c0b7a52
+Create Date: 2026-10-17 11:26:02.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e7b9a2d08'
+down_revision = '3f9d1c0b7a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Remplir ensuite avec : flask backfill-matches
+    if 'match' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table('match',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_a_id', sa.Integer(), nullable=False),
+        sa.Column('user_b_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.CheckConstraint('user_a_id < user_b_id', name='ordered_match'),
+        sa.ForeignKeyConstraint(['user_a_id'], ['user.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['user_b_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('user_a_id', 'user_b_id', name='unique_match')
+    )
+    with op.batch_alter_table('match', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_match_user_b_id'), ['user_b_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('match', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_match_user_b_id'))
+
+    op.drop_table('match')
@@ -0,0 +1,37 @@
+"""Add profile picture derivatives
+
+Revision ID: d2a6c9e4f170
+Revises: 8e0a4d7f3b16
+Create Date: 2026-10-17 14:41:08.902517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6c9e4f170'
+down_revision = '8e0a4d7f3b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Générer ensuite les tailles des photos existantes : flask process-images
+    inspector = sa.inspect(op.get_bind())
+    if 'profile' not in inspector.get_table_names():
+        return
+    if 'picture_full' in {c['name'] for c in inspector.get_columns('profile')}:
+        return
+
+    with op.batch_alter_table('profile', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('picture_avatar', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('picture_card', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('picture_full', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('profile', schema=None) as batch_op:
+        batch_op.drop_column('picture_full')
+        batch_op.drop_column('picture_card')
+        batch_op.drop_column('picture_avatar')
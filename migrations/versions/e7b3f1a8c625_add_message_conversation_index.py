@@ -0,0 +1,32 @@
+"""Add conversation index on message
+
+Revision ID: e7b3f1a8c625
+Revises: d2a6c9e4f170
+Create Date: 2026-10-17 15:06:31.214870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7b3f1a8c625'
+down_revision = 'd2a6c9e4f170'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'message' not in inspector.get_table_names():
+        return
+    if 'ix_message_conversation' in {i['name'] for i in inspector.get_indexes('message')}:
+        return
+
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.create_index('ix_message_conversation', ['sender_id', 'receiver_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('message', schema=None) as batch_op:
+        batch_op.drop_index('ix_message_conversation')
@@ -0,0 +1,44 @@
+"""Add unread notification counter to user
+
+Revision ID: f4c8a2d6e913
+Revises: e7b3f1a8c625
+Create Date: 2026-10-17 15:52:19.640381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4c8a2d6e913'
+down_revision = 'e7b3f1a8c625'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    if 'user' not in inspector.get_table_names():
+        return
+    if 'unread_notifications' in {c['name'] for c in inspector.get_columns('user')}:
+        return
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_notifications', sa.Integer(), server_default='0', nullable=False))
+
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('unread_notifications', sa.Integer))
+    notification = sa.table('notification',
+        sa.column('user_id', sa.Integer),
+        sa.column('is_read', sa.Boolean)
+    )
+    unread = sa.select(sa.func.count()).where(
+        notification.c.user_id == user.c.id,
+        notification.c.is_read == sa.false()
+    ).scalar_subquery()
+    bind.execute(user.update().values(unread_notifications=unread))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('unread_notifications')
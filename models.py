@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 import secrets
 
+import geo
+
 db = SQLAlchemy()
 
 
@@ -24,6 +27,12 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
     accepted_terms = db.Column(db.Boolean, default=False, nullable=False)
+    # Tenu à jour à chaque notification créée, remis à zéro à la lecture : le
+    # badge de base.html n'a pas besoin de COUNT(*).
+    unread_notifications = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    
+    # Curseur de /browse : les plus récents d'abord, sans COUNT ni OFFSET.
+    __table_args__ = (db.Index('ix_user_created_at_id', 'created_at', 'id'),)
     
     profile = db.relationship('Profile', backref='user', uselist=False, cascade='all, delete-orphan')
     sent_messages = db.relationship('Message', foreign_keys='Message.sender_id', backref='sender', lazy='dynamic', cascade='all, delete-orphan')
@@ -35,29 +44,22 @@ class User(UserMixin, db.Model):
     blocks_made = db.relationship('Block', foreign_keys='Block.blocker_id', backref='blocker', lazy='dynamic', cascade='all, delete-orphan')
     blocks_received = db.relationship('Block', foreign_keys='Block.blocked_id', backref='blocked_user', lazy='dynamic', cascade='all, delete-orphan')
     
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-    
     def generate_reset_token(self):
         self.reset_token = secrets.token_urlsafe(32)
         self.reset_token_expiry = datetime.utcnow() + timedelta(hours=1)
         return self.reset_token
     
     def get_matches(self):
-        likes_i_gave = [like.liked_id for like in self.likes_given.all()]
-        likes_i_received = [like.liker_id for like in self.likes_received.all()]
-        matches = list(set(likes_i_gave) & set(likes_i_received))
-        return User.query.filter(User.id.in_(matches)).all()
+        return User.query.options(db.joinedload(User.profile)).join(Match, db.or_(
+            (Match.user_a_id == self.id) & (Match.user_b_id == User.id),
+            (Match.user_b_id == self.id) & (Match.user_a_id == User.id)
+        )).order_by(Match.created_at.desc()).all()
     
     def has_liked(self, user_id):
         return self.likes_given.filter_by(liked_id=user_id).first() is not None
     
     def is_matched(self, user_id):
-        return (self.has_liked(user_id) and 
-                Like.query.filter_by(liker_id=user_id, liked_id=self.id).first() is not None)
+        return Match.exists_between(self.id, user_id)
     
     def has_blocked(self, user_id):
         return self.blocks_made.filter_by(blocked_id=user_id).first() is not None
@@ -78,13 +80,27 @@ class Profile(db.Model):
     bio = db.Column(db.Text)
     
     profile_picture = db.Column(db.String(255))
+    picture_avatar = db.Column(db.String(255))
+    picture_card = db.Column(db.String(255))
+    picture_full = db.Column(db.String(255))
     city = db.Column(db.String(100))
     country = db.Column(db.String(100))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    geo_cell = db.Column(db.Integer, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.Index('ix_profile_latitude_longitude', 'latitude', 'longitude'),)
     
     interests = db.relationship('Interest', secondary=profile_interests, backref='profiles')
     
+    def picture_path(self, size):
+        return getattr(self, f'picture_{size}') or self.profile_picture
+    
+    def picture_webp_path(self, size):
+        path = getattr(self, f'picture_{size}')
+        return path.rsplit('.', 1)[0] + '.webp' if path else None
+    
     def get_age(self):
         if self.date_of_birth:
             today = datetime.utcnow().date()
@@ -101,6 +117,24 @@ class Profile(db.Model):
             coords_2 = (other_profile.latitude, other_profile.longitude)
             return geodesic(coords_1, coords_2).kilometers
         return None
+    
+    @classmethod
+    def within_radius(cls, latitude, longitude, radius_km):
+        # Préfiltre SQL (cellules + boîte englobante) ; la distance exacte reste à vérifier.
+        lat_min, lat_max, lon_ranges = geo.bounding_box(latitude, longitude, radius_km)
+        conditions = [cls.latitude.between(lat_min, lat_max)]
+        if lon_ranges:
+            conditions.append(db.or_(*[cls.longitude.between(lo, hi) for lo, hi in lon_ranges]))
+        cells = geo.cells_in_box(lat_min, lat_max, lon_ranges)
+        if cells is not None:
+            conditions.append(cls.geo_cell.in_(cells))
+        return db.and_(*conditions)
+
+
+@event.listens_for(Profile, 'before_insert')
+@event.listens_for(Profile, 'before_update')
+def update_geo_cell(mapper, connection, profile):
+    profile.geo_cell = geo.cell_id(profile.latitude, profile.longitude)
 
 
 class Interest(db.Model):
@@ -120,8 +154,73 @@ class Like(db.Model):
     __table_args__ = (db.UniqueConstraint('liker_id', 'liked_id', name='unique_like'),)
     
     def is_match(self):
-        reverse_like = Like.query.filter_by(liker_id=self.liked_id, liked_id=self.liker_id).first()
-        return reverse_like is not None
+        return Match.exists_between(self.liker_id, self.liked_id)
+
+
+class Match(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_a_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    user_b_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('user_a_id', 'user_b_id', name='unique_match'),
+        db.CheckConstraint('user_a_id < user_b_id', name='ordered_match'),
+    )
+    
+    @staticmethod
+    def ordered(user_id, other_id):
+        return min(user_id, other_id), max(user_id, other_id)
+    
+    @classmethod
+    def for_pair(cls, user_id, other_id):
+        user_a_id, user_b_id = cls.ordered(user_id, other_id)
+        return cls.query.filter_by(user_a_id=user_a_id, user_b_id=user_b_id)
+    
+    @classmethod
+    def exists_between(cls, user_id, other_id):
+        return db.session.query(cls.for_pair(user_id, other_id).exists()).scalar()
+    
+    @classmethod
+    def lock_pair(cls, user_id, other_id):
+        # Verrou de transaction sur la paire : deux likes croisés simultanés
+        # s'exécutent l'un après l'autre, le second voit le like du premier.
+        # SQLite n'a qu'un écrivain à la fois, le verrou y est implicite.
+        if db.session.get_bind().dialect.name == 'postgresql':
+            db.session.execute(db.select(db.func.pg_advisory_xact_lock(*cls.ordered(user_id, other_id))))
+    
+    @classmethod
+    def create(cls, user_id, other_id):
+        # Idempotent : le match n'est créé qu'une fois (True), même si un
+        # autre chemin (backfill-matches) l'a déjà inséré.
+        user_a_id, user_b_id = cls.ordered(user_id, other_id)
+        insert = postgresql.insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+        result = db.session.execute(
+            insert(cls).values(user_a_id=user_a_id, user_b_id=user_b_id, created_at=datetime.utcnow())
+            .on_conflict_do_nothing(index_elements=['user_a_id', 'user_b_id'])
+        )
+        return result.rowcount == 1
+    
+    @classmethod
+    def backfill_from_likes(cls):
+        like_back = db.aliased(Like)
+        pairs = db.select(
+            Like.liker_id,
+            Like.liked_id,
+            db.case((Like.created_at > like_back.created_at, Like.created_at), else_=like_back.created_at)
+        ).join(
+            like_back, (like_back.liker_id == Like.liked_id) & (like_back.liked_id == Like.liker_id)
+        ).where(
+            Like.liker_id < Like.liked_id,
+            ~db.select(cls.id).where(
+                cls.user_a_id == Like.liker_id, cls.user_b_id == Like.liked_id
+            ).exists()
+        )
+        result = db.session.execute(
+            db.insert(cls).from_select(['user_a_id', 'user_b_id', 'created_at'], pairs)
+        )
+        db.session.commit()
+        return result.rowcount
 
 
 class Message(db.Model):
@@ -132,6 +231,40 @@ class Message(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     is_read = db.Column(db.Boolean, default=False)
     
+    __table_args__ = (
+        db.Index('ix_message_conversation', 'sender_id', 'receiver_id', 'created_at', 'id'),
+    )
+    
+    @classmethod
+    def history(cls, user_id, other_id, before=None, limit=50):
+        """Retourne les `limit` messages précédant le curseur (created_at, id), du plus ancien au plus récent.
+
+        Chaque sens de la conversation est lu séparément sur l'index composite,
+        déjà trié : on ne parcourt jamais plus de 2 × (limit + 1) lignes.
+        """
+        rows = []
+        for sender_id, receiver_id in ((user_id, other_id), (other_id, user_id)):
+            query = cls.query.filter(cls.sender_id == sender_id, cls.receiver_id == receiver_id)
+            if before:
+                query = query.filter(db.tuple_(cls.created_at, cls.id) < before)
+            rows += query.order_by(cls.created_at.desc(), cls.id.desc()).limit(limit + 1).all()
+        
+        rows.sort(key=lambda m: (m.created_at, m.id), reverse=True)
+        has_more = len(rows) > limit
+        return rows[:limit][::-1], has_more
+    
+    @property
+    def cursor(self):
+        return f'{self.created_at.isoformat()}_{self.id}'
+    
+    @staticmethod
+    def parse_cursor(value):
+        try:
+            created_at, message_id = value.rsplit('_', 1)
+            return datetime.fromisoformat(created_at), int(message_id)
+        except (AttributeError, ValueError):
+            return None
+    
     def __repr__(self):
         return f'<Message from {self.sender_id} to {self.receiver_id}>'
 
@@ -167,3 +300,104 @@ class Notification(db.Model):
     
     user = db.relationship('User', foreign_keys=[user_id], backref='notifications')
     related_user = db.relationship('User', foreign_keys=[related_user_id])
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'content': self.content,
+            'related_user_id': self.related_user_id,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+    
+    @staticmethod
+    def mark_all_read(user):
+        if not user.unread_notifications:
+            return
+        read = Notification.query.filter_by(user_id=user.id, is_read=False).update({'is_read': True})
+        # On retire ce qui vient d'être lu plutôt que de remettre à zéro : une
+        # notification créée entre-temps reste comptée.
+        user.unread_notifications = User.unread_notifications - read if read else 0
+
+
+@event.listens_for(Notification, 'after_insert')
+def count_unread_notification(mapper, connection, notification):
+    users = User.__table__
+    connection.execute(
+        users.update()
+        .where(users.c.id == notification.user_id)
+        .values(unread_notifications=users.c.unread_notifications + 1)
+    )
+
+
+class RecommendationCache(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    candidate_ids = db.Column(db.Text, nullable=False, default='')
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def get_ids(self):
+        return [int(i) for i in self.candidate_ids.split(',') if i]
+    
+    def set_ids(self, ids):
+        self.candidate_ids = ','.join(str(i) for i in ids)
+
+
+class SwipeDeck(db.Model):
+    # File de candidats à présenter un par un : identifiants int32 empaquetés
+    # (4 octets chacun) et position de lecture, pour un dépilement en O(1).
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    candidate_ids = db.Column(db.LargeBinary, nullable=False, default=b'')
+    size = db.Column(db.Integer, nullable=False, default=0)
+    position = db.Column(db.Integer, nullable=False, default=0)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    @property
+    def remaining(self):
+        return self.size - self.position
+
+
+class EmailOutbox(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    kind = db.Column(db.String(20), nullable=False)
+    digest_key = db.Column(db.String(64), index=True)
+    digest_count = db.Column(db.Integer, default=1, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    send_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+    
+    __table_args__ = (db.Index('ix_email_outbox_status_send_after', 'status', 'send_after'),)
+
+
+class StatCounter(db.Model):
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+    reconciled_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class StatSnapshot(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False)
+
+
+class GeocodeCache(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    city_key = db.Column(db.String(100), nullable=False)
+    country_key = db.Column(db.String(100), nullable=False)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    source = db.Column(db.String(20), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('city_key', 'country_key', name='unique_geocode_place'),)
+    
+    @property
+    def found(self):
+        return self.latitude is not None and self.longitude is not None
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+from flask import current_app, url_for
+from flask_mail import Message as EmailMessage
+
+from models import db, EmailOutbox
+
+
+def _enabled():
+    return current_app.config['MAIL_ENABLED']
+
+
+def queue_match_email(user1, user2):
+    if not _enabled():
+        return
+
+    db.session.add(EmailOutbox(
+        recipient=user1.email,
+        subject='Nouveau match sur Onlyz !',
+        kind='match',
+        body=f'''Félicitations {user1.username} !
+
+Vous avez un nouveau match avec {user2.username} !
+
+Connectez-vous maintenant pour commencer à discuter :
+{url_for('chat', user_id=user2.id, _external=True)}
+
+L'équipe Onlyz
+'''
+    ))
+
+
+def _message_body(sender, receiver, count):
+    if count == 1:
+        news = f'Vous avez reçu un nouveau message de {sender.username} !'
+    else:
+        news = f'Vous avez reçu {count} nouveaux messages de {sender.username} !'
+    return f'''Bonjour {receiver.username},
+
+{news}
+
+Connectez-vous pour le lire :
+{url_for('chat', user_id=sender.id, _external=True)}
+
+L'équipe Onlyz
+'''
+
+
+def queue_message_email(sender, receiver):
+    if not _enabled():
+        return
+
+    # Les messages d'une même conversation arrivant pendant la fenêtre de
+    # regroupement partent dans un seul email récapitulatif. Seule une ligne
+    # pas encore due peut être complétée : une ligne due peut être en cours
+    # d'envoi par deliver_pending, et le verrou écarte celle qu'il vient de prendre.
+    digest_key = f'message:{sender.id}:{receiver.id}'
+    pending = EmailOutbox.query.filter(
+        EmailOutbox.digest_key == digest_key,
+        EmailOutbox.status == 'pending',
+        EmailOutbox.send_after > datetime.utcnow()
+    ).with_for_update(skip_locked=True).first()
+    if pending:
+        pending.digest_count += 1
+        pending.body = _message_body(sender, receiver, pending.digest_count)
+        return
+
+    db.session.add(EmailOutbox(
+        recipient=receiver.email,
+        subject='Nouveau message sur Onlyz',
+        kind='message',
+        digest_key=digest_key,
+        body=_message_body(sender, receiver, 1),
+        send_after=datetime.utcnow() + timedelta(seconds=current_app.config['MAIL_DIGEST_WINDOW'])
+    ))
+
+
+def _retry(entry, error):
+    config = current_app.config
+    entry.attempts += 1
+    entry.last_error = str(error)[:1000]
+    if entry.attempts >= config['MAIL_MAX_ATTEMPTS']:
+        entry.status = 'failed'
+    else:
+        delay = config['MAIL_RETRY_BACKOFF'] * 2 ** (entry.attempts - 1)
+        entry.send_after = datetime.utcnow() + timedelta(seconds=delay)
+
+
+def claim(batch_size):
+    """Réserve un lot d'emails dus et valide aussitôt : l'envoi SMTP se fait hors transaction.
+
+    Le lot passe en 'sending' jusqu'à la fin du bail MAIL_SEND_LEASE ; un worker
+    arrêté en cours d'envoi laisse ses emails repris à l'expiration du bail
+    (envoi au moins une fois).
+    """
+    now = datetime.utcnow()
+    entries = EmailOutbox.query.filter(
+        EmailOutbox.status.in_(['pending', 'sending']),
+        EmailOutbox.send_after <= now
+    ).order_by(EmailOutbox.send_after).limit(batch_size).with_for_update(skip_locked=True).all()
+    lease = now + timedelta(seconds=current_app.config['MAIL_SEND_LEASE'])
+    for entry in entries:
+        entry.status = 'sending'
+        entry.send_after = lease
+    # Lus avant le commit, qui expirerait les lignes.
+    batch = [(entry.id, entry.recipient, entry.subject, entry.body) for entry in entries]
+    db.session.commit()
+    return batch
+
+
+def deliver_pending(mail, batch_size=None):
+    batch_size = batch_size or current_app.config['MAIL_OUTBOX_BATCH']
+    batch = claim(batch_size)
+    if not batch:
+        return 0
+
+    sent_at = {}
+    errors = {}
+    try:
+        # Une seule session SMTP pour tout le lot, sans transaction ni verrou ouverts.
+        with mail.connect() as connection:
+            for entry_id, recipient, subject, body in batch:
+                try:
+                    connection.send(EmailMessage(subject=subject, recipients=[recipient], body=body))
+                except Exception as error:
+                    errors[entry_id] = error
+                else:
+                    sent_at[entry_id] = datetime.utcnow()
+    except Exception as error:
+        for entry_id, *_ in batch:
+            if entry_id not in sent_at:
+                errors.setdefault(entry_id, error)
+
+    entries = EmailOutbox.query.filter(EmailOutbox.id.in_([entry_id for entry_id, *_ in batch])).all()
+    for entry in entries:
+        if entry.id in sent_at:
+            entry.status = 'sent'
+            entry.sent_at = sent_at[entry.id]
+        else:
+            entry.status = 'pending'
+            _retry(entry, errors[entry.id])
+    db.session.commit()
+    return len(sent_at)
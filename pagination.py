@@ -0,0 +1,99 @@
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(*values):
+    parts = []
+    for value in values:
+        if isinstance(value, datetime):
+            parts.append(value.isoformat())
+        elif isinstance(value, float):
+            parts.append(repr(value))
+        else:
+            parts.append(str(value))
+    return '_'.join(parts)
+
+
+def decode_cursor(value, *types):
+    """Inverse d'encode_cursor ; None si le curseur est absent ou invalide."""
+    if not value:
+        return None
+    parts = value.split('_')
+    if len(parts) != len(types):
+        return None
+    try:
+        return tuple(
+            datetime.fromisoformat(part) if kind is datetime else kind(part)
+            for part, kind in zip(parts, types)
+        )
+    except ValueError:
+        return None
+
+
+def after(columns, values):
+    """Condition « strictement après le curseur » pour un tri sur columns.
+
+    columns est une liste de (expression, décroissant) dans l'ordre du ORDER BY.
+    """
+    clauses = []
+    for i, ((column, descending), value) in enumerate(zip(columns, values)):
+        step = column < value if descending else column > value
+        equal = [prev == prev_value for (prev, _), prev_value in zip(columns[:i], values[:i])]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def order(columns):
+    return [column.desc() if descending else column.asc() for column, descending in columns]
+
+
+def stream_page(query, key, page_size, accept=None, scan_limit=None):
+    """Lit une requête triée jusqu'à remplir une page de lignes acceptées.
+
+    Sans filtre Python, une seule requête LIMIT page_size + 1. Avec un filtre
+    (accept), les lignes arrivent par lots et la lecture s'arrête dès que la
+    page est pleine, ou après scan_limit lignes examinées : la page est alors
+    incomplète et le curseur reprend juste après la dernière ligne examinée.
+    Retourne (lignes, curseur suivant ou None).
+    """
+    if accept is None:
+        rows = query.limit(page_size + 1).all()
+        if len(rows) > page_size:
+            return rows[:page_size], key(rows[page_size - 1])
+        return rows, None
+
+    if scan_limit:
+        query = query.limit(scan_limit + 1)
+    page, examined, previous = [], 0, None
+    for row in query.yield_per(page_size * 2):
+        if examined == scan_limit:
+            return page, key(previous)
+        examined += 1
+        if accept(row):
+            if len(page) == page_size:
+                return page, key(page[-1])
+            page.append(row)
+        previous = row
+    return page, None
+
+
+def keyset_page(query, keyset, key, page_size, cursor=None, backwards=False):
+    """Page d'une requête triée sur keyset, lue après le curseur ou, si backwards, avant lui.
+
+    Une seule requête LIMIT page_size + 1, sans COUNT ni OFFSET : le coût ne
+    dépend pas de la profondeur de la page. Retourne (lignes dans l'ordre du
+    keyset, curseur de la page précédente ou None, curseur de la suivante ou None).
+    """
+    columns = [(column, not descending) for column, descending in keyset] if backwards else keyset
+    if cursor:
+        query = query.filter(after(columns, cursor))
+    rows = query.order_by(*order(columns)).limit(page_size + 1).all()
+    more = len(rows) > page_size
+    rows = rows[:page_size]
+    if not rows:
+        return rows, None, None
+    if backwards:
+        rows.reverse()
+        return rows, key(rows[0]) if more else None, key(rows[-1])
+    return rows, key(rows[0]) if cursor else None, key(rows[-1]) if more else None
@@ -0,0 +1,110 @@
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from pools import ProcessPool
+
+
+class PasswordHashBusy(RuntimeError):
+    pass
+
+
+class PasswordHasher:
+    """Hachage des mots de passe dans un pool de processus borné.
+
+    scrypt/PBKDF2 occupent le CPU plusieurs dizaines de millisecondes : exécutés
+    dans le worker, ils bloquent la boucle eventlet/gevent et donc tous les
+    sockets du chat. Au-delà de PASSWORD_HASH_MAX_PENDING calculs en cours ou
+    en attente, PasswordHashBusy est levée aussitôt plutôt que d'allonger la file.
+
+    Sous eventlet, le calcul passe par eventlet.tpool (voir pools.ProcessPool),
+    hashlib relâchant le GIL pendant scrypt et PBKDF2.
+
+    La méthode (et son facteur de travail) est en tête de chaque hash, par
+    exemple scrypt:32768:8:1$... : c'est sa version. Un hash d'une autre
+    méthode que PASSWORD_HASH_METHOD est refait à la connexion suivante.
+    """
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pending = 0
+        self._counts = {'hashed': 0, 'verified': 0, 'rehashed': 0, 'rejected': 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING']
+        self.timeout = app.config['PASSWORD_HASH_TIMEOUT']
+
+    def _run(self, func, *args):
+        # 0 worker : calcul sur place (tests, commandes CLI).
+        if not self.workers:
+            return func(*args)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self._counts['rejected'] += 1
+                raise PasswordHashBusy()
+            self._pending += 1
+            if self._pool is None:
+                self._pool = ProcessPool(self.workers)
+        # La place est rendue quand le calcul se termine, pas quand on cesse
+        # de l'attendre : un calcul abandonné après le délai occupe toujours le pool.
+        try:
+            future = self._pool.submit(func, *args)
+        except BaseException:
+            # Pas de calcul lancé, donc pas de rappel pour rendre la place.
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._release)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            with self._lock:
+                self._counts['rejected'] += 1
+            raise PasswordHashBusy()
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def _incr(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def hash(self, password):
+        pwhash = self._run(generate_password_hash, password, self.method)
+        self._incr('hashed')
+        return pwhash
+
+    def verify(self, pwhash, password):
+        valid = self._run(check_password_hash, pwhash, password)
+        self._incr('verified')
+        return valid
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.method
+
+    def rehash(self, user, password):
+        """Refait le hash d'un mot de passe vérifié ; sous charge, attend la prochaine connexion."""
+        if not self.needs_rehash(user.password_hash):
+            return False
+        try:
+            user.password_hash = self.hash(password)
+        except PasswordHashBusy:
+            return False
+        self._incr('rehashed')
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._counts,
+                'pending': self._pending,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'method': self.method,
+            }
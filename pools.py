@@ -0,0 +1,67 @@
+import multiprocessing
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def eventlet_patched():
+    if 'eventlet' not in sys.modules:
+        return False
+    from eventlet import patcher
+    return patcher.is_monkey_patched('thread')
+
+
+class ProcessPool:
+    """Pool de processus pour le travail CPU (photos, mots de passe), créé au premier usage.
+
+    Les processus sont lancés en spawn : forkés, ils hériteraient du socket
+    d'écoute et survivraient au serveur. Sous eventlet, le pool de
+    concurrent.futures se bloque (sémaphores multiprocessing non coopératifs) :
+    le travail passe alors par les threads système de eventlet.tpool, et
+    submit() renvoie un Future résolu depuis un greenthread.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _discard(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def submit(self, func, *args):
+        if not eventlet_patched():
+            executor = self._get_executor()
+            try:
+                return executor.submit(func, *args)
+            except BrokenProcessPool:
+                # Un processus mort (tué, manque de mémoire) rend tout l'exécuteur
+                # inutilisable : il est remplacé, le travail soumis au nouveau.
+                self._discard(executor)
+                return self._get_executor().submit(func, *args)
+
+        import eventlet
+        from eventlet import tpool
+
+        future = Future()
+        future.set_running_or_notify_cancel()
+
+        def run():
+            try:
+                future.set_result(tpool.execute(func, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        eventlet.spawn_n(run)
+        return future
@@ -0,0 +1,77 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, bindparam
+
+from models import db, User
+
+
+class LastSeenBuffer:
+    def __init__(self, app=None):
+        self._pending = {}
+        self._recorded = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.skipped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.min_interval = timedelta(seconds=app.config['LAST_SEEN_MIN_INTERVAL'])
+        self.max_pending = app.config['LAST_SEEN_MAX_PENDING']
+        atexit.register(self.flush)
+
+    def touch(self, user_id, stored_last_seen, now=None):
+        now = now or datetime.utcnow()
+        if stored_last_seen and now - stored_last_seen < self.min_interval:
+            self.skipped += 1
+            return
+        with self._lock:
+            recorded = self._recorded.get(user_id)
+            if recorded and now - recorded < self.min_interval:
+                self.skipped += 1
+                return
+            self._recorded[user_id] = now
+            self._pending[user_id] = now
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                horizon = datetime.utcnow() - self.min_interval
+                self._recorded = {uid: ts for uid, ts in self._recorded.items() if ts >= horizon}
+            if not pending:
+                return 0
+
+            table = User.__table__
+            statement = update(table).where(table.c.id == bindparam('b_id')).values(last_seen=bindparam('b_last_seen'))
+            rows = [{'b_id': uid, 'b_last_seen': ts} for uid, ts in pending.items()]
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        connection.execute(statement, rows)
+            except Exception:
+                # On remet les entrées en attente, sans écraser un passage plus récent.
+                with self._lock:
+                    for uid, ts in pending.items():
+                        if uid not in self._pending:
+                            self._pending[uid] = ts
+                raise
+            self.flushes += 1
+            self.flushed_rows += len(rows)
+            return len(rows)
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'skipped': self.skipped,
+        }
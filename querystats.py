@@ -0,0 +1,147 @@
+import json
+import logging
+import time
+from functools import wraps
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+
+from models import db
+
+
+logger = logging.getLogger('onlyz.sql')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryProfile:
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.duration = 0.0
+        self.statements = {}
+        self.slowest = []
+
+    def record(self, statement, duration, keep):
+        self.count += 1
+        self.duration += duration
+        seen = self.statements.setdefault(statement, [0, 0.0])
+        seen[0] += 1
+        seen[1] += duration
+        self.slowest.append((duration, statement))
+        if len(self.slowest) > keep:
+            self.slowest.sort(reverse=True)
+            del self.slowest[keep:]
+
+    def repeated(self, threshold):
+        """Requêtes identiques exécutées au moins threshold fois : N+1 probable."""
+        return {statement: count for statement, (count, _) in self.statements.items() if count >= threshold}
+
+    def to_dict(self, threshold):
+        return {
+            'name': self.name,
+            'queries': self.count,
+            'db_ms': round(self.duration * 1000, 2),
+            'slowest': [
+                {'ms': round(duration * 1000, 2), 'sql': ' '.join(statement.split())[:200]}
+                for duration, statement in sorted(self.slowest, reverse=True)
+            ],
+            'repeated': [
+                {'count': count, 'sql': ' '.join(statement.split())[:200]}
+                for statement, count in self.repeated(threshold).items()
+            ],
+        }
+
+
+class QueryProfiler:
+    """Compte les requêtes SQL et leur durée par requête HTTP et par événement Socket.IO.
+
+    Les mesures viennent des événements du moteur SQLAlchemy et ne concernent
+    que le contexte en cours : les tâches de fond ne sont pas comptées. Chaque
+    mesure est journalisée en JSON sur le logger onlyz.sql, renvoyée en
+    en-têtes X-Query-* en mode debug, et comparée au budget de l'endpoint.
+    """
+
+    def __init__(self, app=None):
+        self.exceeded = 0
+        self.repeated = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.budgets = app.config['QUERY_BUDGETS']
+        self.action = app.config['QUERY_BUDGET_ACTION']
+        self.repeat_threshold = app.config['QUERY_REPEAT_THRESHOLD']
+        self.keep = app.config['QUERY_SLOWEST']
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_execute)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info['query_start'].pop()
+        profile = g.get('query_profile') if has_app_context() else None
+        if profile is not None:
+            profile.record(statement, duration, self.keep)
+
+    def start(self, name):
+        g.query_profile = QueryProfile(name)
+        return g.query_profile
+
+    def finish(self):
+        profile = g.pop('query_profile', None)
+        if profile is None:
+            return None
+
+        report = profile.to_dict(self.repeat_threshold)
+        budget = self.budgets.get(profile.name)
+        problems = []
+        if budget is not None and profile.count > budget:
+            self.exceeded += 1
+            problems.append(f'{profile.count} requêtes pour un budget de {budget}')
+        if report['repeated']:
+            self.repeated += 1
+            problems.append(f"{len(report['repeated'])} requête(s) répétée(s), N+1 probable")
+
+        report['budget'] = budget
+        logger.log(logging.WARNING if problems else logging.INFO, json.dumps(report, ensure_ascii=False))
+        if problems and self.action == 'raise':
+            raise QueryBudgetExceeded(f"{profile.name} : {' ; '.join(problems)}")
+        return profile
+
+    def _start_request(self):
+        self.start(request.endpoint)
+
+    def _finish_request(self, response):
+        profile = self.finish()
+        if profile is not None and self.app.debug:
+            response.headers['X-Query-Count'] = str(profile.count)
+            response.headers['X-Query-Time'] = f'{profile.duration * 1000:.2f}ms'
+        return response
+
+    def track(self, name):
+        """Décorateur pour un handler Socket.IO : mesure chaque événement reçu."""
+        def decorator(handler):
+            @wraps(handler)
+            def wrapper(*args, **kwargs):
+                self.start(name)
+                try:
+                    return handler(*args, **kwargs)
+                finally:
+                    self.finish()
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return {
+            'budgets': dict(self.budgets),
+            'exceeded': self.exceeded,
+            'repeated': self.repeated,
+        }
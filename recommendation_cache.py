@@ -0,0 +1,113 @@
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from models import db, User, Profile, RecommendationCache
+
+
+SCORE_RADIUS_KM = 100
+
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0, 'stores': 0, 'patches': 0, 'invalidations': 0, 'precomputed': 0, 'evicted': 0}
+
+
+def _count(key, n=1):
+    with _lock:
+        stats[key] += n
+
+
+def get_stats():
+    with _lock:
+        snapshot = dict(stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_rate'] = round(snapshot['hits'] / lookups, 4) if lookups else None
+    snapshot['rows'] = RecommendationCache.query.count()
+    return snapshot
+
+
+def _is_fresh(entry):
+    ttl = timedelta(seconds=current_app.config['RECOMMENDATION_CACHE_TTL'])
+    return entry.computed_at and datetime.utcnow() - entry.computed_at < ttl
+
+
+def get(user_id, limit):
+    entry = db.session.get(RecommendationCache, user_id)
+    if entry is None or not _is_fresh(entry):
+        _count('misses')
+        return None
+    _count('hits')
+    return entry.get_ids()[:limit]
+
+
+def store(user_id, ids):
+    entry = db.session.get(RecommendationCache, user_id) or RecommendationCache(user_id=user_id)
+    entry.set_ids(ids)
+    entry.computed_at = datetime.utcnow()
+    db.session.add(entry)
+    _count('stores')
+
+
+def remove_candidate(user_id, candidate_id, keep_at_least):
+    # Patch incrémental : on retire le candidat sans recalculer le classement,
+    # tant qu'il reste de quoi remplir une page.
+    entry = db.session.get(RecommendationCache, user_id)
+    if entry is None:
+        return
+    ids = entry.get_ids()
+    if candidate_id not in ids:
+        return
+    ids.remove(candidate_id)
+    if len(ids) < keep_at_least:
+        db.session.delete(entry)
+        _count('invalidations')
+    else:
+        entry.set_ids(ids)
+        _count('patches')
+
+
+def invalidate(*user_ids):
+    deleted = RecommendationCache.query.filter(
+        RecommendationCache.user_id.in_(user_ids)
+    ).delete(synchronize_session=False)
+    _count('invalidations', deleted)
+
+
+def invalidate_nearby(latitude, longitude):
+    # Un profil ne rapporte des points de distance qu'à moins de 100 km.
+    if not (latitude and longitude):
+        return
+    nearby = db.select(Profile.user_id).where(Profile.within_radius(latitude, longitude, SCORE_RADIUS_KM))
+    deleted = RecommendationCache.query.filter(
+        RecommendationCache.user_id.in_(nearby)
+    ).delete(synchronize_session=False)
+    _count('invalidations', deleted)
+
+
+def precompute(compute, batch_size=None):
+    config = current_app.config
+    batch_size = batch_size or config['RECOMMENDATION_PRECOMPUTE_BATCH']
+    now = datetime.utcnow()
+
+    # Éviction : les utilisateurs inactifs ne gardent pas de ligne en cache.
+    inactive = db.select(User.id).where(
+        User.last_seen < now - timedelta(days=config['RECOMMENDATION_CACHE_EVICT_DAYS'])
+    )
+    evicted = RecommendationCache.query.filter(
+        RecommendationCache.user_id.in_(inactive)
+    ).delete(synchronize_session=False)
+    _count('evicted', evicted)
+
+    stale_before = now - timedelta(seconds=config['RECOMMENDATION_CACHE_TTL'])
+    users = User.query.join(Profile).outerjoin(
+        RecommendationCache, RecommendationCache.user_id == User.id
+    ).filter(
+        User.last_seen >= now - timedelta(days=config['RECOMMENDATION_ACTIVE_DAYS']),
+        db.or_(RecommendationCache.user_id.is_(None), RecommendationCache.computed_at < stale_before)
+    ).order_by(User.last_seen.desc()).limit(batch_size).all()
+
+    for user in users:
+        store(user.id, compute(user))
+    db.session.commit()
+    _count('precomputed', len(users))
+    return len(users)
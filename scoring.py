@@ -0,0 +1,190 @@
+from datetime import datetime
+
+import numpy as np
+from geopy.distance import geodesic
+from sqlalchemy import select, extract, cast, Integer
+
+from exclusions import exclusion_clause
+from models import db, User, Profile, profile_interests
+
+
+DISTANCE_BUCKETS = ((10, 50), (50, 30), (100, 10))
+AGE_BUCKETS = ((5, 30), (10, 15))
+INTEREST_POINTS = 10
+
+EARTH_RADIUS_KM = 6371.0088
+WGS84_A_KM = 6378.137
+WGS84_E2 = 0.0066943799901413165
+# Écart maximal à geodesic : ~0,56 % pour haversine, ~0,04 % pour
+# l'approximation ellipsoïdale locale sous 110 km. Près d'un seuil on
+# recalcule la distance exacte pour garder exactement les mêmes paliers.
+HAVERSINE_TOLERANCE = 0.01
+ELLIPSOID_TOLERANCE = 0.002
+
+
+class CandidatePool:
+    def __init__(self, user_ids, latitude, longitude, birth_year, birth_md, interest_bits):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.latitude = np.asarray(latitude, dtype=np.float64)
+        self.longitude = np.asarray(longitude, dtype=np.float64)
+        self.birth_year = np.asarray(birth_year, dtype=np.int64)
+        self.birth_md = np.asarray(birth_md, dtype=np.int64)
+        self.interest_bits = np.asarray(interest_bits, dtype=np.uint64)
+        if self.interest_bits.ndim == 1:
+            self.interest_bits = self.interest_bits.reshape(len(self.user_ids), -1)
+
+    def __len__(self):
+        return len(self.user_ids)
+
+
+def interest_bitset(interest_ids, vocabulary):
+    positions = {interest_id: i for i, interest_id in enumerate(vocabulary)}
+    bits = np.zeros(max(1, (len(vocabulary) + 63) // 64), dtype=np.uint64)
+    for interest_id in interest_ids:
+        pos = positions.get(interest_id)
+        if pos is not None:
+            bits[pos // 64] |= np.uint64(1) << np.uint64(pos % 64)
+    return bits
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    lat1, lon1 = np.radians(latitude), np.radians(longitude)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def local_ellipsoid_km(latitude, longitude, latitudes, longitudes):
+    phi = np.radians((latitude + latitudes) / 2)
+    w2 = 1 - WGS84_E2 * np.sin(phi) ** 2
+    meridional = WGS84_A_KM * (1 - WGS84_E2) / w2 ** 1.5
+    normal = WGS84_A_KM / np.sqrt(w2)
+    dlon = np.radians((longitudes - longitude + 540) % 360 - 180)
+    return np.hypot(meridional * np.radians(latitudes - latitude), normal * np.cos(phi) * dlon)
+
+
+def ages_on(today, birth_year, birth_md):
+    return today.year - birth_year - ((today.month * 100 + today.day) < birth_md)
+
+
+def score_pool(pool, latitude, longitude, age, interest_bits, today=None):
+    today = today or datetime.utcnow().date()
+    scores = np.zeros(len(pool), dtype=np.int64)
+
+    # Même règle de véracité que Profile.get_distance : 0.0 compte comme absent.
+    if latitude and longitude:
+        located = np.flatnonzero(
+            ~np.isnan(pool.latitude) & ~np.isnan(pool.longitude)
+            & (pool.latitude != 0) & (pool.longitude != 0)
+        )
+        distances = haversine_km(latitude, longitude, pool.latitude[located], pool.longitude[located])
+
+        max_threshold = DISTANCE_BUCKETS[-1][0]
+        close = np.flatnonzero(distances < max_threshold * (1 + HAVERSINE_TOLERANCE))
+        distances[close] = local_ellipsoid_km(latitude, longitude,
+                                              pool.latitude[located[close]], pool.longitude[located[close]])
+
+        near_edge = distances < 1e-3
+        for threshold, _ in DISTANCE_BUCKETS:
+            near_edge |= np.abs(distances - threshold) <= threshold * ELLIPSOID_TOLERANCE
+        for i in np.flatnonzero(near_edge):
+            j = located[i]
+            distances[i] = geodesic((latitude, longitude), (pool.latitude[j], pool.longitude[j])).kilometers
+
+        points = np.zeros(len(distances), dtype=np.int64)
+        for threshold, bonus in reversed(DISTANCE_BUCKETS):
+            points[distances < threshold] = bonus
+        points[distances == 0] = 0
+        scores[located] += points
+
+    age_diff = np.abs(age - ages_on(today, pool.birth_year, pool.birth_md))
+    age_points = np.zeros(len(pool), dtype=np.int64)
+    for threshold, bonus in reversed(AGE_BUCKETS):
+        age_points[age_diff < threshold] = bonus
+    scores += age_points
+
+    common = np.bitwise_count(pool.interest_bits & np.asarray(interest_bits, dtype=np.uint64)).sum(axis=1)
+    scores += common.astype(np.int64) * INTEREST_POINTS
+    return scores
+
+
+def top_k(scores, k):
+    # Tri partiel puis tri stable : à score égal, l'ordre du pool est conservé.
+    if len(scores) > k:
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    else:
+        candidates = np.arange(len(scores))
+    order = np.argsort(-scores[candidates], kind='stable')
+    return candidates[order][:k]
+
+
+def compatibility_clause(profile):
+    # Attirance réciproque : le candidat cherche ce genre, et en a un recherché par l'utilisateur.
+    clause = Profile.looking_for.in_([profile.gender, 'tous'])
+    if profile.looking_for != 'tous':
+        clause = db.and_(clause, Profile.gender == profile.looking_for)
+    return clause
+
+
+def candidate_query(user):
+    return select(Profile.user_id).join(User, User.id == Profile.user_id).where(
+        exclusion_clause(user.id, include_likes=True),
+        compatibility_clause(user.profile)
+    )
+
+
+def load_pool(user):
+    candidates = candidate_query(user).add_columns(
+        Profile.id,
+        Profile.latitude,
+        Profile.longitude,
+        cast(extract('year', Profile.date_of_birth), Integer),
+        cast(extract('month', Profile.date_of_birth), Integer) * 100
+        + cast(extract('day', Profile.date_of_birth), Integer),
+    ).order_by(Profile.user_id)
+    rows = db.session.execute(candidates).all()
+
+    vocabulary = sorted(i.id for i in user.profile.interests)
+    n_words = max(1, (len(vocabulary) + 63) // 64)
+    bits = np.zeros((len(rows), n_words), dtype=np.uint64)
+    if not rows:
+        return CandidatePool([], [], [], [], [], bits), interest_bitset(vocabulary, vocabulary)
+
+    user_ids, profile_ids, latitude, longitude, birth_year, birth_md = zip(*rows)
+    profile_ids = np.asarray(profile_ids, dtype=np.int64)
+
+    if vocabulary:
+        positions = {interest_id: i for i, interest_id in enumerate(vocabulary)}
+        subquery = candidate_query(user).with_only_columns(Profile.id)
+        links = db.session.execute(
+            select(profile_interests.c.profile_id, profile_interests.c.interest_id).where(
+                profile_interests.c.interest_id.in_(vocabulary),
+                profile_interests.c.profile_id.in_(subquery)
+            )
+        ).all()
+        if links:
+            link_profiles, link_interests = zip(*links)
+            sorter = np.argsort(profile_ids)
+            rows_idx = sorter[np.searchsorted(profile_ids, link_profiles, sorter=sorter)]
+            pos = np.array([positions[i] for i in link_interests], dtype=np.uint64)
+            np.bitwise_or.at(bits, (rows_idx, (pos // 64).astype(np.int64)), np.uint64(1) << (pos % 64))
+
+    pool = CandidatePool(
+        user_ids,
+        np.array(latitude, dtype=np.float64),
+        np.array(longitude, dtype=np.float64),
+        birth_year,
+        birth_md,
+        bits,
+    )
+    return pool, interest_bitset(vocabulary, vocabulary)
+
+
+def rank_candidates(user, limit=12):
+    pool, user_bits = load_pool(user)
+    if not len(pool):
+        return []
+    scores = score_pool(pool, user.profile.latitude, user.profile.longitude,
+                        user.profile.get_age(), user_bits)
+    return [int(pool.user_ids[i]) for i in top_k(scores, limit)]
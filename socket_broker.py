@@ -0,0 +1,118 @@
+"""File de messages Socket.IO locale, pour tester plusieurs workers sans Redis.
+
+Le broker relaie chaque publication à toutes les connexions abonnées ; les
+workers s'y abonnent via LocalPubSubManager avec
+SOCKETIO_MESSAGE_QUEUE=local://127.0.0.1:5790.
+
+    python socket_broker.py --port 5790
+"""
+import argparse
+import json
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+from socketio.pubsub_manager import PubSubManager
+
+
+AUTHKEY = b'onlyz-socketio'
+
+
+def parse_url(url):
+    host, port = url[len('local://'):].rsplit(':', 1)
+    return host, int(port)
+
+
+def serve(host='127.0.0.1', port=5790, ready=None):
+    subscribers = []
+    lock = threading.Lock()
+
+    def relay(conn):
+        try:
+            # Premier message : le rôle de la connexion (publication ou abonnement).
+            if conn.recv_bytes() == b'subscribe':
+                with lock:
+                    subscribers.append(conn)
+            while True:
+                frame = conn.recv_bytes()
+                with lock:
+                    targets = list(subscribers)
+                for target in targets:
+                    try:
+                        target.send_bytes(frame)
+                    except OSError:
+                        with lock:
+                            if target in subscribers:
+                                subscribers.remove(target)
+        except (EOFError, OSError):
+            pass
+        finally:
+            with lock:
+                if conn in subscribers:
+                    subscribers.remove(conn)
+            conn.close()
+
+    with Listener((host, port), authkey=AUTHKEY) as listener:
+        if ready is not None:
+            ready.set()
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=relay, args=(conn,), daemon=True).start()
+
+
+class LocalPubSubManager(PubSubManager):
+    name = 'local'
+
+    def __init__(self, url='local://127.0.0.1:5790', channel='flask-socketio', write_only=False, logger=None):
+        self.address = parse_url(url)
+        # Connexion au premier envoi, comme les autres files : importer app
+        # (commandes CLI, benchmarks, processus du pool) ne demande pas le broker.
+        self.publisher = None
+        self.publish_lock = threading.Lock()
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+
+    def _connect_publisher(self):
+        publisher = Client(self.address, authkey=AUTHKEY)
+        publisher.send_bytes(b'publish')
+        return publisher
+
+    def _publish(self, data):
+        frame = json.dumps({'channel': self.channel, 'data': data}).encode()
+        with self.publish_lock:
+            # Une nouvelle tentative si la connexion a été perdue (broker redémarré).
+            for retry in (False, True):
+                try:
+                    if self.publisher is None:
+                        self.publisher = self._connect_publisher()
+                    self.publisher.send_bytes(frame)
+                    return
+                except OSError:
+                    self.publisher = None
+                    if retry:
+                        raise
+
+    def _listen(self):
+        # Connexion dédiée : la lecture bloquante ne gêne pas les publications.
+        # Broker absent ou redémarré : nouvelles tentatives espacées, comme RedisManager.
+        retry_sleep = 1
+        while True:
+            try:
+                subscriber = Client(self.address, authkey=AUTHKEY)
+                subscriber.send_bytes(b'subscribe')
+                retry_sleep = 1
+                while True:
+                    message = json.loads(subscriber.recv_bytes())
+                    if message.get('channel') == self.channel:
+                        yield message['data']
+            except (OSError, EOFError):
+                self._get_logger().error('Broker local injoignable, nouvelle tentative dans %s s', retry_sleep)
+                time.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5790)
+    args = parser.parse_args()
+    serve(args.host, args.port)
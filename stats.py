@@ -0,0 +1,186 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, update, bindparam
+from sqlalchemy.dialects import postgresql, sqlite
+
+from models import db, User, Profile, Like, Match, Message, StatCounter, StatSnapshot
+
+
+# Compteurs du tableau de bord admin et requête qui donne leur vraie valeur.
+COUNTERS = {
+    'users': User,
+    'profiles': Profile,
+    'likes': Like,
+    'matches': Match,
+    'messages': Message,
+}
+
+
+def _insert():
+    return postgresql.insert if db.session.get_bind().dialect.name == 'postgresql' else sqlite.insert
+
+
+class StatsCounters:
+    """Totaux tenus à jour par les chemins d'écriture.
+
+    Les incréments, faits après le commit de l'écriture, s'accumulent en
+    mémoire avec leur heure et sont ajoutés en base par flush() : aucune
+    transaction utilisateur ne verrouille la ligne d'un compteur. Toutes les
+    STATS_RECONCILE_INTERVAL secondes, un seul worker recale les compteurs sur
+    les vrais COUNT(*) et fige les valeurs du jour pour les tendances. Un
+    incrément noté avant le dernier recalage est déjà compté par celui-ci :
+    flush() l'écarte au lieu de l'ajouter une seconde fois.
+    """
+
+    def __init__(self, app=None):
+        self._pending = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.flushes = 0
+        self.reconciles = 0
+        self.discarded = 0
+        self.drift = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.reconcile_interval = timedelta(seconds=app.config['STATS_RECONCILE_INTERVAL'])
+        atexit.register(self.flush)
+
+    def incr(self, name, delta=1):
+        if not delta:
+            return
+        with self._lock:
+            self._pending.append((name, datetime.utcnow(), delta))
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+
+            table = StatCounter.__table__
+            statement = update(table).where(table.c.name == bindparam('b_name')).values(
+                value=table.c.value + bindparam('b_delta'),
+                updated_at=datetime.utcnow()
+            )
+            try:
+                with self.app.app_context():
+                    with db.engine.begin() as connection:
+                        # Verrouillés avant l'ajout : un recalage concurrent passe avant ou après, pas pendant.
+                        reconciled = dict(connection.execute(
+                            select(table.c.name, table.c.reconciled_at).with_for_update()
+                        ).all())
+                        deltas, discarded = self._deltas(pending, reconciled)
+                        if deltas:
+                            connection.execute(statement, [
+                                {'b_name': name, 'b_delta': delta} for name, delta in deltas.items()
+                            ])
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = pending
+                raise
+            self.discarded += discarded
+            self.flushes += 1
+        return len(deltas)
+
+    @staticmethod
+    def _deltas(pending, reconciled):
+        """Somme les incréments par compteur, sans ceux déjà couverts par le dernier recalage."""
+        deltas, discarded = {}, 0
+        for name, recorded_at, delta in pending:
+            # Compteur jamais initialisé : l'incrément est perdu, le prochain recalage le crée.
+            if name not in reconciled:
+                continue
+            reconciled_at = reconciled[name]
+            if reconciled_at is not None and recorded_at < reconciled_at:
+                discarded += 1
+                continue
+            deltas[name] = deltas.get(name, 0) + delta
+        return deltas, discarded
+
+    def reconcile(self, due_only=False):
+        """Recale chaque compteur sur son COUNT(*) réel. Seul moment où l'on lit les grosses tables.
+
+        Avec due_only, ne recale que si le dernier recalage date de plus de
+        STATS_RECONCILE_INTERVAL secondes et renvoie None sinon : les workers
+        se verrouillent sur les mêmes lignes, le premier recale, les suivants
+        voient reconciled_at déjà avancé. En cas d'échec rien n'est écrit.
+        """
+        self.flush()
+        with self._flush_lock:
+            with self.app.app_context():
+                # Compteurs manquants créés sans conflit si deux recalages se croisent.
+                db.session.execute(_insert()(StatCounter).values([
+                    {'name': name, 'value': 0} for name in COUNTERS
+                ]).on_conflict_do_nothing(index_elements=['name']))
+                # Verrouillés avant de compter : un flush concurrent attend la fin du recalage.
+                counters = {c.name: c for c in StatCounter.query.with_for_update().all()}
+                if due_only and all(
+                    c.reconciled_at is not None
+                    and c.reconciled_at >= datetime.utcnow() - self.reconcile_interval
+                    for c in counters.values()
+                ):
+                    db.session.rollback()
+                    return None
+                # Pris avant le COUNT(*) : tout incrément noté plus tôt vient d'une ligne comptée ici.
+                now = datetime.utcnow()
+                counts = db.session.execute(select(*[
+                    select(func.count()).select_from(model).scalar_subquery().label(name)
+                    for name, model in COUNTERS.items()
+                ])).one()._asdict()
+                for name, value in counts.items():
+                    counter = counters[name]
+                    self.drift[name] = value - counter.value
+                    counter.value = value
+                    counter.reconciled_at = now
+                db.session.commit()
+            self.reconciles += 1
+            return counts
+
+    def snapshot(self, day=None):
+        day = day or datetime.utcnow().date()
+        with self.app.app_context():
+            totals = self.totals()
+            insert = _insert()
+            statement = insert(StatSnapshot).values([
+                {'day': day, 'name': name, 'value': value} for name, value in totals.items()
+            ])
+            # Refait à chaque recalage de la journée : mise à jour sur place.
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=['day', 'name'], set_={'value': statement.excluded.value}
+            ))
+            db.session.commit()
+        return totals
+
+    def totals(self):
+        counters = StatCounter.query.all()
+        values = {c.name: c.value for c in counters}
+        if set(COUNTERS) - set(values):
+            return self.reconcile()
+        with self._lock:
+            pending = list(self._pending)
+        deltas, _ = self._deltas(pending, {c.name: c.reconciled_at for c in counters})
+        for name, delta in deltas.items():
+            values[name] += delta
+        return values
+
+    def trends(self, days=30):
+        since = datetime.utcnow().date() - timedelta(days=days)
+        series = {}
+        for row in StatSnapshot.query.filter(StatSnapshot.day >= since).order_by(StatSnapshot.day):
+            series.setdefault(row.day, {})[row.name] = row.value
+        return series
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'flushes': self.flushes,
+            'reconciles': self.reconciles,
+            'discarded': self.discarded,
+            'drift': dict(self.drift),
+        }
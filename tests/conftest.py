@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# Base SQLite temporaire, fixée avant le premier import de app.
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'tests.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
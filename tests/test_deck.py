@@ -0,0 +1,44 @@
+"""Paquet de profils (deck.py) : candidats likés depuis la construction du paquet."""
+from datetime import date
+
+import pytest
+
+from app import app
+from models import db, User, Profile, Like
+import deck
+import exclusions
+
+
+@pytest.fixture
+def users():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = []
+        for i in range(3):
+            user = User(username=f'deck{i}', email=f'deck{i}@example.com', password_hash='x')
+            user.profile = Profile(date_of_birth=date(1990, 1, 1), gender='femme', looking_for='homme')
+            users.append(user)
+        db.session.add_all(users)
+        db.session.commit()
+        exclusions.invalidate(*[user.id for user in users])
+        yield users
+        db.session.remove()
+
+
+def test_pop_skips_like_missing_from_cache(users):
+    user, liked, other = users
+
+    def rank(user, limit):
+        return [liked.id, other.id]
+
+    deck.build(user, rank)
+    db.session.commit()
+    # Cache chargé avant le like, fait par exemple sur un autre worker.
+    assert not exclusions.is_excluded(user.id, liked.id)
+    db.session.add(Like(liker_id=user.id, liked_id=liked.id))
+    db.session.commit()
+
+    candidate_id, remaining = deck.pop(user, rank)
+    assert candidate_id == other.id
+    assert remaining == 0
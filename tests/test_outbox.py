@@ -0,0 +1,191 @@
+"""File d'emails (outbox.py) : regroupement des messages, réservation et envoi hors transaction."""
+import socketserver
+import threading
+from datetime import datetime, timedelta
+
+import flask_mail
+import pytest
+
+from app import app, mail
+from models import db, User, EmailOutbox
+import outbox
+
+
+@pytest.fixture
+def users(monkeypatch):
+    monkeypatch.setitem(app.config, 'MAIL_ENABLED', True)
+    # Pas de serveur SMTP : Flask-Mail signale l'envoi sans se connecter.
+    monkeypatch.setattr(app.extensions['mail'], 'suppress', True)
+    with app.test_request_context():
+        db.drop_all()
+        db.create_all()
+        sender = User(username='alice', email='alice@example.com', password_hash='x')
+        receiver = User(username='bob', email='bob@example.com', password_hash='x')
+        db.session.add_all([sender, receiver])
+        db.session.commit()
+        yield sender, receiver
+        db.session.remove()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    """Serveur SMTP minimal : note chaque connexion et les messages reçus sur elle."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        messages = []
+        self.server.sessions.append(messages)
+        envelope = {'rcpt': []}
+        self.reply('220 localhost')
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            if not line:
+                return
+            command = line[:4].upper()
+            if command == 'EHLO':
+                self.reply('250 localhost')
+            elif command == 'MAIL':
+                envelope = {'from': line[10:], 'rcpt': []}
+                self.reply('250 OK')
+            elif command == 'RCPT':
+                envelope['rcpt'].append(line[8:].strip('<>'))
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while (data_line := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(data_line)
+                envelope['data'] = b''.join(data)
+                messages.append(envelope)
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPHandler)
+    server.daemon_threads = True
+    server.sessions = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state = app.extensions['mail']
+    monkeypatch.setattr(state, 'suppress', False)
+    monkeypatch.setattr(state, 'server', '127.0.0.1')
+    monkeypatch.setattr(state, 'port', server.server_address[1])
+    monkeypatch.setattr(state, 'use_tls', False)
+    monkeypatch.setattr(state, 'use_ssl', False)
+    monkeypatch.setattr(state, 'username', None)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_due(entry):
+    entry.send_after = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_messages_coalesce_until_due(users):
+    sender, receiver = users
+    outbox.queue_message_email(sender, receiver)
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    entry = EmailOutbox.query.one()
+    assert entry.digest_count == 2
+    assert '2 nouveaux messages' in entry.body
+
+    # Une ligne due peut être en cours d'envoi : le message suivant en ouvre une autre.
+    make_due(entry)
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    assert sorted(e.digest_count for e in EmailOutbox.query) == [1, 2]
+
+
+def test_claimed_row_is_not_coalesced(users):
+    sender, receiver = users
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    make_due(EmailOutbox.query.one())
+    assert len(outbox.claim(10)) == 1
+
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    claimed = EmailOutbox.query.filter_by(status='sending').one()
+    assert claimed.digest_count == 1
+    assert EmailOutbox.query.filter_by(status='pending').count() == 1
+
+
+def test_deliver_sends_and_marks_sent(users):
+    sender, receiver = users
+    outbox.queue_match_email(sender, receiver)
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    for entry in EmailOutbox.query:
+        make_due(entry)
+
+    with mail.record_messages() as sent:
+        assert outbox.deliver_pending(mail) == 2
+    assert sorted(m.recipients[0] for m in sent) == ['alice@example.com', 'bob@example.com']
+    assert {e.status for e in EmailOutbox.query} == {'sent'}
+    assert outbox.deliver_pending(mail) == 0
+
+
+def test_send_outbox_uses_one_smtp_session(users, smtp_server):
+    sender, receiver = users
+    others = [User(username=f'user{i}', email=f'user{i}@example.com', password_hash='x') for i in range(3)]
+    db.session.add_all(others)
+    db.session.commit()
+    for other in others:
+        outbox.queue_match_email(other, sender)
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    for entry in EmailOutbox.query:
+        make_due(entry)
+
+    result = app.test_cli_runner().invoke(args=['send-outbox'])
+    assert result.exit_code == 0, result.output
+    assert '4 emails envoyés' in result.output
+
+    # Tout le lot passe par une seule connexion SMTP.
+    assert len(smtp_server.sessions) == 1
+    received = smtp_server.sessions[0]
+    assert sorted(r for message in received for r in message['rcpt']) == sorted(
+        ['bob@example.com'] + [other.email for other in others]
+    )
+    db.session.expire_all()
+    assert {e.status for e in EmailOutbox.query} == {'sent'}
+
+
+def test_failed_send_is_retried_later(users, monkeypatch):
+    sender, receiver = users
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    make_due(EmailOutbox.query.one())
+
+    def refuse(connection, message):
+        raise OSError('connexion refusée')
+
+    monkeypatch.setattr(flask_mail.Connection, 'send', refuse)
+    assert outbox.deliver_pending(mail) == 0
+    entry = EmailOutbox.query.one()
+    assert entry.status == 'pending'
+    assert entry.attempts == 1
+    assert entry.last_error == 'connexion refusée'
+    assert entry.send_after > datetime.utcnow()
+
+
+def test_expired_lease_is_reclaimed(users):
+    sender, receiver = users
+    outbox.queue_message_email(sender, receiver)
+    db.session.commit()
+    make_due(EmailOutbox.query.one())
+    assert len(outbox.claim(10)) == 1
+    assert outbox.claim(10) == []
+
+    # Worker arrêté pendant l'envoi : la ligne est reprise à la fin du bail.
+    make_due(EmailOutbox.query.one())
+    assert len(outbox.claim(10)) == 1
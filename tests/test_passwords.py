@@ -0,0 +1,37 @@
+"""Pool de hachage des mots de passe (passwords.py) : places rendues et pool cassé."""
+import os
+import signal
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app import app
+from passwords import PasswordHasher
+from pools import ProcessPool
+
+
+class BrokenPool:
+    def submit(self, func, *args):
+        raise BrokenProcessPool('processus mort')
+
+
+def test_failed_submit_releases_slot(monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_WORKERS', 1)
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_MAX_PENDING', 1)
+    hasher = PasswordHasher(app)
+    hasher._pool = BrokenPool()
+    for _ in range(3):
+        with pytest.raises(BrokenProcessPool):
+            hasher.hash('secret')
+    assert hasher.stats()['pending'] == 0
+
+
+def test_broken_pool_is_replaced():
+    pool = ProcessPool(1)
+    try:
+        worker_pid = pool.submit(os.getpid).result(timeout=30)
+        with pytest.raises(BrokenProcessPool):
+            pool.submit(os.kill, worker_pid, signal.SIGKILL).result(timeout=30)
+        assert pool.submit(pow, 2, 10).result(timeout=30) == 1024
+    finally:
+        pool._executor.shutdown()
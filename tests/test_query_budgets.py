@@ -0,0 +1,27 @@
+"""Plafonds de requêtes SQL (QUERY_BUDGETS) des pages de listes et des actions courantes.
+
+Même mesure que benchmarks/check_queries.py, sur une base SQLite temporaire.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+import check_queries  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def measurements():
+    return {r['page']: r for r in check_queries.measure()}
+
+
+@pytest.mark.parametrize('page', check_queries.PAGES)
+def test_query_budget(measurements, page):
+    result = measurements.get(page)
+    if result is None:
+        pytest.skip('pas de page suivante')
+    assert result['status'] == 200
+    assert result['statements'] <= result['budget'], (
+        f"{result['method']} {result['path']} : {result['statements']} requêtes, plafond {result['budget']}"
+    )
@@ -0,0 +1,64 @@
+"""Recherche par mots-clés (/search) : pagination sur le curseur (pertinence, id)."""
+from datetime import date
+
+import pytest
+from flask import template_rendered
+
+from app import app
+from models import db, User, Profile
+import fulltext
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(app.config, 'SEARCH_PAGE_SIZE', 2)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = []
+        for i in range(6):
+            user = User(username=f'search{i}', email=f'search{i}@example.com', password_hash='x')
+            # Même bio pour tous : même pertinence, l'ordre ne dépend que de l'id.
+            user.profile = Profile(date_of_birth=date(1990, 1, 1), gender='femme',
+                                   looking_for='homme', bio='musique')
+            users.append(user)
+        db.session.add_all(users)
+        db.session.flush()
+        fulltext.refresh()
+        db.session.commit()
+        searcher_id = users[0].id
+        expected = [user.id for user in users[1:]]
+        db.session.remove()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(searcher_id)
+        session['_fresh'] = True
+    return client, expected
+
+
+def search_page(client, after=None):
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        rendered.append(context)
+
+    params = {'gender': '', 'min_age': 18, 'max_age': 99, 'max_distance': 100, 'keywords': 'musique'}
+    if after:
+        params['after'] = after
+    with template_rendered.connected_to(record, app):
+        assert client.get('/search', query_string=params).status_code == 200
+    context = next(c for c in rendered if 'results' in c)
+    return [user.id for user in context['results']], context['next_cursor']
+
+
+def test_tied_relevance_spans_pages(client):
+    client, expected = client
+    seen, cursor = [], None
+    while True:
+        ids, cursor = search_page(client, cursor)
+        seen.extend(ids)
+        if not cursor:
+            break
+    # Cinq profils à égalité sur trois pages de deux : aucun sauté ni répété.
+    assert seen == expected
@@ -0,0 +1,54 @@
+"""Compteurs du tableau de bord (stats.py) : incréments d'autres workers et recalage."""
+import pytest
+
+from app import app
+from models import db, User, StatCounter
+from stats import StatsCounters
+
+
+@pytest.fixture
+def counters():
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield StatsCounters(app)
+        db.session.remove()
+
+
+def add_user(name):
+    db.session.add(User(username=name, email=f'{name}@example.com', password_hash='x'))
+    db.session.commit()
+
+
+def value(name):
+    db.session.expire_all()
+    return db.session.get(StatCounter, name).value
+
+
+def test_delta_counted_by_reconcile_is_discarded(counters):
+    other_worker = StatsCounters(app)
+    counters.reconcile()
+    add_user('alice')
+    other_worker.incr('users')
+
+    # L'inscription est déjà dans le COUNT(*) : l'autre worker ne doit pas la rajouter.
+    assert counters.reconcile()['users'] == 1
+    other_worker.flush()
+    assert value('users') == 1
+    assert other_worker.discarded == 1
+
+
+def test_delta_after_reconcile_is_applied(counters):
+    counters.reconcile()
+    add_user('alice')
+    counters.incr('users')
+    assert counters.totals()['users'] == 1
+    counters.flush()
+    assert value('users') == 1
+    assert counters.discarded == 0
+
+
+def test_reconcile_only_when_due(counters):
+    assert counters.reconcile(due_only=True) is not None
+    assert counters.reconcile(due_only=True) is None
+    assert counters.reconciles == 1
@@ -0,0 +1,169 @@
+import inspect
+import threading
+import types
+
+from flask import has_request_context, session
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import LRUCache
+from models import db, User, Profile, Notification
+
+
+# Instantané par utilisateur des champs lus à chaque requête (barre de
+# navigation, filtres de profil). Comme pour les exclusions, le TTL borne la
+# durée pendant laquelle un autre processus peut servir un instantané périmé ;
+# les changements faits par l'utilisateur lui-même passent par la version
+# gardée dans sa session, valable sur tous les workers.
+_cache = LRUCache('users', maxsize=10000, ttl=30)
+
+USER_FIELDS = ('id', 'username', 'email', 'is_admin', 'created_at', 'last_seen', 'accepted_terms',
+               'unread_notifications')
+PROFILE_FIELDS = tuple(attr.key for attr in db.inspect(Profile).column_attrs)
+
+VERSION_KEY = '_user_version'
+
+_lock = threading.Lock()
+stats = {'stale': 0, 'loads': 0}
+
+
+def init_app(app):
+    _cache.maxsize = app.config['USER_CACHE_SIZE']
+    _cache.ttl = app.config['USER_CACHE_TTL']
+
+
+def _count(key):
+    with _lock:
+        stats[key] += 1
+
+
+def get_stats():
+    with _lock:
+        snapshot = dict(stats)
+    cached = _cache.stats()
+    # Requêtes servies entièrement par l'instantané, sans lecture de l'utilisateur en base.
+    snapshot['db_free'] = cached['hits'] - snapshot['stale'] - snapshot['loads']
+    return snapshot
+
+
+class _Snapshot:
+    """Lecture seule depuis le cache ; tout le reste passe par l'objet de la base.
+
+    Une écriture, une relation ou un champ absent de l'instantané chargent
+    l'objet réel, qui sert ensuite toutes les lectures de la requête.
+    """
+    _model = None
+
+    def __init__(self, fields, load):
+        object.__setattr__(self, '_fields', fields)
+        object.__setattr__(self, '_load', load)
+        object.__setattr__(self, '_real', None)
+
+    def _materialize(self):
+        if self._real is None:
+            object.__setattr__(self, '_real', self._load())
+        return self._real
+
+    def __getattr__(self, name):
+        if self._real is None:
+            if name in self._fields:
+                return self._fields[name]
+            # Méthodes du modèle (get_age, picture_path...) appliquées à l'instantané.
+            attr = inspect.getattr_static(self._model, name, None)
+            if inspect.isfunction(attr):
+                return types.MethodType(attr, self)
+        return getattr(self._materialize(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._materialize(), name, value)
+
+
+class CachedProfile(_Snapshot):
+    _model = Profile
+
+
+class CachedUser(UserMixin, _Snapshot):
+    _model = User
+
+    def __init__(self, fields, profile_fields):
+        super().__init__(fields, self._load_user)
+        profile = None
+        if profile_fields is not None:
+            profile = CachedProfile(profile_fields, lambda: self._materialize().profile)
+        object.__setattr__(self, '_profile', profile)
+
+    def _load_user(self):
+        _count('loads')
+        return User.query.options(db.joinedload(User.profile)).get(self._fields['id'])
+
+    @property
+    def profile(self):
+        if self._real is not None:
+            return self._real.profile
+        return self._profile
+
+
+def _version():
+    return session.get(VERSION_KEY, 0) if has_request_context() else 0
+
+
+def _snapshot(user):
+    fields = {name: getattr(user, name) for name in USER_FIELDS}
+    profile_fields = None
+    if user.profile is not None:
+        profile_fields = {name: getattr(user.profile, name) for name in PROFILE_FIELDS}
+    return fields, profile_fields
+
+
+def load(user_id):
+    """Utilisateur de la requête : instantané en cache, ou lu en base (profil compris) et mis en cache."""
+    entry = _cache.get(user_id)
+    if entry is not None:
+        version, fields, profile_fields = entry
+        if version == _version():
+            return CachedUser(fields, profile_fields)
+        _count('stale')
+
+    user = User.query.options(db.joinedload(User.profile)).get(user_id)
+    if user is not None:
+        _cache.set(user_id, (_version(), *_snapshot(user)))
+    return user
+
+
+def fresh(user):
+    """L'objet de la base, pour les routes qui lisent puis écrivent l'utilisateur."""
+    if isinstance(user, _Snapshot):
+        return user._materialize()
+    return user
+
+
+def invalidate(*user_ids):
+    _cache.delete(*user_ids)
+    # Changement sur l'utilisateur connecté : sa session change de version,
+    # les instantanés des autres workers ne correspondent plus.
+    if has_request_context() and session.get('_user_id') in {str(user_id) for user_id in user_ids}:
+        session[VERSION_KEY] = session.get(VERSION_KEY, 0) + 1
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(db_session, flush_context):
+    changed = db_session.info.setdefault('user_cache_changed', set())
+    for obj in (*db_session.new, *db_session.dirty, *db_session.deleted):
+        if isinstance(obj, User):
+            changed.add(obj.id)
+        elif isinstance(obj, (Profile, Notification)):
+            # Une notification créée change le compteur de non-lues (mis à jour en SQL).
+            changed.add(obj.user_id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changes(db_session):
+    changed = db_session.info.pop('user_cache_changed', None)
+    if changed:
+        invalidate(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(db_session):
+    db_session.info.pop('user_cache_changed', None)